@@ -0,0 +1,65 @@
+"""Compare two pytest-benchmark JSON files and flag regressions.
+
+    python benchmark/compare_benchmarks.py baseline.json current.json --threshold 0.1
+
+Exits with status 1 if any benchmark's mean tick time or peak allocation grew
+by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return {bench["fullname"]: bench for bench in data["benchmarks"]}
+
+
+def change(before, after):
+    if not before:
+        return 0.0
+    return (after - before) / before
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare two pytest-benchmark JSON result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative growth counted as a regression")
+    args = parser.parse_args(args)
+
+    baseline, current = load(args.baseline), load(args.current)
+
+    regressions = []
+    print(f"{'benchmark':<80} {'mean ms':>12} {'change':>8} {'peak KiB':>12} {'change':>8}")
+    for name in sorted(set(baseline) & set(current)):
+        before, after = baseline[name], current[name]
+
+        mean_before, mean_after = before["stats"]["mean"], after["stats"]["mean"]
+        alloc_before = before["extra_info"].get("peak_alloc_bytes", 0)
+        alloc_after = after["extra_info"].get("peak_alloc_bytes", 0)
+        time_change = change(mean_before, mean_after)
+        alloc_change = change(alloc_before, alloc_after)
+
+        flag = ""
+        if time_change > args.threshold or alloc_change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+
+        print(
+            f"{name:<80} {mean_after * 1000:12.3f} {time_change:+8.1%} "
+            f"{alloc_after / 1024:12.1f} {alloc_change:+8.1%}{flag}"
+        )
+
+    for name in sorted(set(baseline) ^ set(current)):
+        print(f"{name:<80} only in {'baseline' if name in baseline else 'current'}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
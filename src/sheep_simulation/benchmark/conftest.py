@@ -0,0 +1,97 @@
+"""Benchmarks for the simulation hot paths.
+
+Run from src/sheep_simulation with pytest-benchmark installed:
+
+    python -m pytest benchmark --benchmark-json=results.json
+
+and compare two runs with benchmark/compare_benchmarks.py. The grid grows with
+the flock so density, and so the work per sheep, stays at the default
+100 sheep in a 50x50 grid for every flock size.
+"""
+import math
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from sheep_simulation.arena import Arena
+from sheep_simulation.flock_layout import FLOCK_LAYOUTS
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.rng import make_rng
+from sheep_simulation.sheep_flock import SheepFlock
+
+FLOCK_SIZES = [50, 500, 5000, 50000]
+LAYOUTS = ["uniform", "clustered"]
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--flock-sizes", default=",".join(str(size) for size in FLOCK_SIZES),
+        help="comma separated flock sizes to benchmark"
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "flock_size" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("--flock-sizes").split(",")]
+        metafunc.parametrize("flock_size", sizes)
+    if "layout" in metafunc.fixturenames:
+        metafunc.parametrize("layout", LAYOUTS)
+
+
+def grid_size_for(flock_size):
+    return 50.0 * math.sqrt(max(flock_size, 100) / 100)
+
+
+@pytest.fixture
+def arena(flock_size):
+    return Arena(Arena.create_grid(grid_size_for(flock_size)), 10.0)
+
+
+@pytest.fixture
+def positions(arena, flock_size, layout):
+    """[N,3] float64 sheep poses, the same for every run."""
+    rng = np.random.default_rng(0)
+    if layout == "clustered":
+        spread = 2.0 * math.sqrt(max(flock_size, 100) / 100)
+        return FLOCK_LAYOUTS[layout](flock_size, arena.grid, rng, spread=spread)
+    return FLOCK_LAYOUTS[layout](flock_size, arena.grid, rng)
+
+
+@pytest.fixture
+def store(positions):
+    """FlockStore of the positions, one per flock size and layout."""
+    store = FlockStore()
+    store.extend([f"sheep{i}" for i in range(len(positions))], positions[:, 0], positions[:, 1], positions[:, 2])
+    return store
+
+
+@pytest.fixture
+def flock(arena, store):
+    """SheepFlock over the store, seeded so every run walks the same."""
+    return SheepFlock(arena, sheep=store, rng=make_rng(0))
+
+
+@pytest.fixture
+def wolves(arena):
+    """Two wolves, one in each wolf pen."""
+    wolves = FlockStore()
+    pens = [arena.wolf_pen_location(i) for i in range(2)]
+    wolves.extend(["wolf1", "wolf2"], [pen[0] for pen in pens], [pen[1] for pen in pens], [0.0, 0.0])
+    return wolves
+
+
+@pytest.fixture
+def record_allocations(benchmark):
+    """Run a function once under tracemalloc and store its peak allocation with the benchmark."""
+    def record(function, *args):
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            function(*args)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_alloc_bytes"] = peak
+
+    return record
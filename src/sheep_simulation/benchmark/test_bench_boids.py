@@ -0,0 +1,31 @@
+import pytest
+
+from sheep_simulation.PsuedoSheepSeperationPort import PsuedoSheep
+from sheep_simulation.neighbor_index import make_neighbor_index
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_update_velocity(benchmark, record_allocations, positions):
+    # One sheep against the whole flock, as the per-sheep path does
+    boids = PsuedoSheep.__new__(PsuedoSheep)
+    boids.logger = None
+    record_allocations(boids.update_velocity, positions[0], positions)
+    benchmark(boids.update_velocity, positions[0], positions)
+
+
+def test_generate_neighbours(benchmark, record_allocations, positions):
+    args = (positions[0], positions, PsuedoSheep.COHESSION_DIST, None)
+    record_allocations(PsuedoSheep.generate_neighbours, *args)
+    benchmark(PsuedoSheep.generate_neighbours, *args)
+
+
+def test_step_flock(benchmark, record_allocations, positions):
+    index = make_neighbor_index("grid", cell_size=10.0)
+
+    def step():
+        index.build(positions)
+        return PsuedoSheep.step_flock(positions, index.query_pairs(PsuedoSheep.COHESSION_DIST))
+
+    record_allocations(step)
+    benchmark(step)
@@ -0,0 +1,68 @@
+import contextlib
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("rclpy")
+pytest.importorskip("visualization_msgs")
+
+from sheep_simulation.master_node import MasterSimulationNode  # noqa: E402
+from sheep_simulation.pose_block import make_pose_block  # noqa: E402
+from sheep_simulation.pose_stream import PoseStream  # noqa: E402
+from sheep_simulation.profiling import NULL_PHASES  # noqa: E402
+
+
+class CollectingPublisher():
+    def publish(self, msg):
+        self.msg = msg
+
+
+class NullProfiling():
+    def tick(self):
+        return contextlib.nullcontext()
+
+
+@pytest.fixture
+def marker_master(arena, positions):
+    # Not a running node: a MasterSimulationNode made with __new__ and only the marker state
+    # sheep_position_callback touches, so no ROS, services or spawning are involved
+    master = MasterSimulationNode.__new__(MasterSimulationNode)
+    master.sheep_markers = []
+    master.sheep_names_client = None
+    master.pending_name_requests = set()
+    master.sheep_stream = PoseStream()
+    master.wolf_stream = PoseStream()
+    master.marker_mode = "entities"
+    master.viz_timer = None  # Draw on every pose block, as with max_viz_rate 0
+    master.sheep_changed = []
+    master.wolf_changed = []
+    master.marker_state_colors = True
+    master.population_markers = {}
+    master.grid = arena.grid
+    master.pen_size = arena.pen_size
+    master.sheep_marker_publisher = CollectingPublisher()
+    # Phase timing is measured by the benchmark itself
+    master.phases = NULL_PHASES
+    master.profiling = NullProfiling()
+    # Handles already resolved, as they are after spawning
+    master.sheep_markers = [master.create_marker("sheep", f"sheep{i}") for i in range(len(positions))]
+    return master
+
+
+@pytest.fixture
+def pose_msg(store):
+    return make_pose_block(store, 1)
+
+
+def test_pose_block_to_entity_markers(benchmark, record_allocations, marker_master, pose_msg):
+    # Decoding a sheep pose block and moving one marker per sheep
+    record_allocations(marker_master.sheep_position_callback, pose_msg)
+    benchmark(marker_master.sheep_position_callback, pose_msg)
+
+
+@pytest.mark.parametrize("marker_mode", ["sphere_list", "points"])
+def test_pose_block_to_population_marker(benchmark, record_allocations, marker_master, pose_msg, marker_mode):
+    # Decoding a sheep pose block and building the single population marker
+    marker_master.marker_mode = marker_mode
+    record_allocations(marker_master.sheep_position_callback, pose_msg)
+    benchmark(marker_master.sheep_position_callback, pose_msg)
@@ -0,0 +1,14 @@
+import pytest
+
+from sheep_simulation.metrics import HerdingMetricsTracker
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_metrics_update(benchmark, record_allocations, flock, wolves, arena):
+    # Runs every tick after the flock step, compare with test_sheep_flock_step
+    tracker = HerdingMetricsTracker(arena)
+    args = (flock.sheep, wolves, flock.pen_occupancy)
+    tracker.update(*args)
+    record_allocations(tracker.update, *args)
+    benchmark(tracker.update, *args)
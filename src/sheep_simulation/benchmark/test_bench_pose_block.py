@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("sheep_simulation_interfaces")
+
+from sheep_simulation.flock_store import FlockStore  # noqa: E402
+from sheep_simulation.pose_block import apply_pose_block, make_pose_block  # noqa: E402
+
+
+def test_make_pose_block(benchmark, record_allocations, store):
+    record_allocations(make_pose_block, store, 1)
+    benchmark(make_pose_block, store, 1)
+
+
+def test_apply_pose_block(benchmark, record_allocations, store):
+    msg = make_pose_block(store, 1)
+    received = FlockStore()
+    record_allocations(apply_pose_block, received, msg)
+    benchmark(apply_pose_block, received, msg)
@@ -0,0 +1,11 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_sheep_flock_step(benchmark, record_allocations, flock, wolves):
+    # The simulation part of SheepSimulationNode.update_simulation, publishing is not included
+    wolves = np.column_stack([wolves.x, wolves.y])
+    record_allocations(flock.step, wolves)
+    benchmark(flock.step, wolves)
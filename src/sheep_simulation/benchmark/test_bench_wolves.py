@@ -0,0 +1,21 @@
+import pytest
+
+from sheep_simulation.wolf_pack import WolfPack
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture
+def pack(arena, store, wolves):
+    return WolfPack(arena, wolves=wolves, sheep=store)
+
+
+def test_assign_sheep_groups(benchmark, record_allocations, pack):
+    record_allocations(pack.assign_sheep_groups)
+    benchmark(pack.assign_sheep_groups)
+
+
+def test_herd_sheep(benchmark, record_allocations, pack):
+    pack.assign_sheep_groups()
+    record_allocations(pack.herd_sheep)
+    benchmark(pack.herd_sheep)
@@ -0,0 +1,13 @@
+import launch
+import launch_ros.actions
+
+
+# Launch simulation only, all three nodes in one process
+def generate_launch_description():
+    return launch.LaunchDescription([
+        launch_ros.actions.Node(
+            package="sheep_simulation",
+            executable="composed",
+            output="screen"
+        )
+    ])
@@ -14,6 +14,7 @@ setup(
         ('share/' + package_name, ['launch/launch.py']),
         ('share/' + package_name, ['launch/launch_rviz.py']),
         ('share/' + package_name, ['launch/launch_sim.py']),
+        ('share/' + package_name, ['launch/launch_composed.py']),
         ('share/' + package_name, ['config/sheep_simulation_config.rviz']),
     ],
     install_requires=['setuptools'],
@@ -27,7 +28,14 @@ setup(
         'console_scripts': [
             'sheep_node = sheep_simulation.sheep_node:main',
             'wolf_node = sheep_simulation.wolf_node:main',
-            'master_node = sheep_simulation.master_node:main'
+            'master_node = sheep_simulation.master_node:main',
+            'neighbor_benchmark = sheep_simulation.neighbor_benchmark:main',
+            'monte_carlo = sheep_simulation.monte_carlo:main',
+            'composed = sheep_simulation.composed:main',
+            'composition_benchmark = sheep_simulation.composition_benchmark:main',
+            'qos_benchmark = sheep_simulation.qos_benchmark:main',
+            'startup_benchmark = sheep_simulation.startup_benchmark:main',
+            'replay_node = sheep_simulation.replay_node:main'
         ],
     },
 )
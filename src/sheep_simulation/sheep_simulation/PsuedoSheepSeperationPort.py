@@ -3,9 +3,7 @@ import math
 import numpy as np
 import time
 
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-from matplotlib import style
+from sheep_simulation.neighbor_index import BruteForceIndex
 
 class PsuedoBorder():
     ##Class Constants
@@ -56,6 +54,7 @@ class PsuedoSheep():
     ##Movement
     UPDATE_INTERVAL = 1.0 #seconds 
     STEP = 1 ## Distance moved
+    MAX_MAGNITUDE = 0.25 ## Largest boids step per update
 
     ##Class Variables
     sheep_pos = np.empty((0,3))
@@ -85,16 +84,17 @@ class PsuedoSheep():
     #         if not any(differences[:] < PsuedoSheep.SEPARATION_DIST):
     #             candidate[2] = th
     #             return candidate
-    def generate_unique_coord(existing_coord):
+    def generate_unique_coord(existing_coord, rng=None):
         ##We don't care if th matches
         th_range = math.pi * 2
+        rng = rng if rng is not None else np.random
 
         ##loop until we generate valid coord
         coord_range = (10, 50)
         while True:
-            x = np.random.uniform(*coord_range)
-            y = np.random.uniform(*coord_range)
-            th=np.random.uniform(0,th_range)
+            x = rng.uniform(*coord_range)
+            y = rng.uniform(*coord_range)
+            th=rng.uniform(0,th_range)
             candidate = np.array([x, y, th])
 
             if existing_coord.size == 0:
@@ -120,9 +120,9 @@ class PsuedoSheep():
         filtered_array = other_coord[mask]
         return filtered_array
 
-    def __init__(self, logger):
+    def __init__(self, logger, rng=None):
         self.logger = logger
-        self.coord = PsuedoSheep.generate_unique_coord(PsuedoSheep.sheep_pos)
+        self.coord = PsuedoSheep.generate_unique_coord(PsuedoSheep.sheep_pos, rng)
         
         self.index = len(PsuedoSheep.sheep_pos)
 
@@ -162,7 +162,7 @@ class PsuedoSheep():
         # #final_angle = np.arctan2(difference_vector[0], difference_vector[1])
 
         # Scale down the vector to a maximum magnitude of 0.5
-        max_magnitude = 0.25
+        max_magnitude = PsuedoSheep.MAX_MAGNITUDE
         if np.linalg.norm(final_vector) > max_magnitude:
             final_vector = final_vector * (max_magnitude / np.linalg.norm(final_vector))
 
@@ -172,6 +172,61 @@ class PsuedoSheep():
 
         return final_vector[0], final_vector[1], final_angle
     
+    @staticmethod
+    def step_flock(positions, neighbours=None):
+        """ Batched update_velocity for the whole flock
+
+            positions is an [N,3] array of (x, y, theta) rows, the result is an [N,3] array of
+            (dx, dy, theta) rows matching update_velocity(positions[i], positions) for every sheep.
+            neighbours is an iterable of (i, j, squared distance) chunks covering at least COHESSION_DIST,
+            e.g. from NeighborIndex.query_pairs, and defaults to a brute force scan"""
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        n = len(positions)
+        xy = positions[:, :2]
+
+        if neighbours is None:
+            index = BruteForceIndex()
+            index.build(positions)
+            neighbours = index.query_pairs(PsuedoSheep.COHESSION_DIST)
+
+        counts = np.zeros(n)
+        centre = np.zeros((n, 2))
+        sep_vector = np.zeros((n, 2))
+        for i, j, squared_distances in neighbours:
+            ##Cohession - sum of neighbours within coh radius
+            coh = squared_distances <= PsuedoSheep.COHESSION_DIST ** 2
+            coh_i, coh_j = i[coh], j[coh]
+            counts += np.bincount(coh_i, minlength=n)
+            centre[:, 0] += np.bincount(coh_i, weights=xy[coh_j, 0], minlength=n)
+            centre[:, 1] += np.bincount(coh_i, weights=xy[coh_j, 1], minlength=n)
+
+            ##Seperation - inverse weighted sum of neighbours within sep radius
+            sep = squared_distances <= PsuedoSheep.SEPARATION_DIST ** 2
+            sep_i, sep_j = i[sep], j[sep]
+            sep_distances = (xy[sep_j] - xy[sep_i]) / squared_distances[sep, None]
+            sep_vector[:, 0] += np.bincount(sep_i, weights=sep_distances[:, 0], minlength=n)
+            sep_vector[:, 1] += np.bincount(sep_i, weights=sep_distances[:, 1], minlength=n)
+
+        ##Head towards the local flock centre
+        has_nbs = counts > 0
+        coh_vector = np.zeros((n, 2))
+        coh_vector[has_nbs] = (centre[has_nbs] / counts[has_nbs, None] - xy[has_nbs]) * PsuedoSheep.COHESSION_WEIGHT
+
+        ##Head away from close neighbours
+        sep_vector *= PsuedoSheep.SEPARATION_WEIGHT * -1
+        sep_norm = np.hypot(sep_vector[:, 0], sep_vector[:, 1])
+        sep_vector[sep_norm > 0] /= sep_norm[sep_norm > 0, None]
+
+        ##Combine, then scale every non-zero vector to the maximum magnitude
+        final_vector = coh_vector + sep_vector
+        final_norm = np.hypot(final_vector[:, 0], final_vector[:, 1])
+        moving = final_norm > 0
+        final_vector[moving] *= PsuedoSheep.MAX_MAGNITUDE / final_norm[moving, None]
+
+        final_angle = np.arctan2(final_vector[:, 1], final_vector[:, 0]) % (2 * np.pi)
+
+        return np.column_stack([final_vector, final_angle])
+
     def calc_cohesion(self,localSheep,globalSheep):
         ##Cohession
         ##Find all neighbours within coh radius
@@ -338,6 +393,8 @@ for pose in sheep positions:
 
 
 def animate(frame, ax1, sheep_list):
+    import matplotlib.pyplot as plt
+
     for sheep in sheep_list:
         sheep.update_position()
 
@@ -355,6 +412,11 @@ def animate(frame, ax1, sheep_list):
     plt.ylim(0, 60)
 
 def main():
+    # matplotlib is only needed for this demo, keeps the simulation importable headless
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+    from matplotlib import style
+
     print("Hello World")
 
     style.use('fivethirtyeight')
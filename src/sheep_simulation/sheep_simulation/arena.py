@@ -0,0 +1,33 @@
+class Arena():
+    """Grid bounds and pen geometry shared by the sheep and wolf logic."""
+
+    def __init__(self, grid, pen_size):
+        self.grid = grid
+        self.pen_size = pen_size
+
+        # Sheep pen in the top right corner
+        self.pen_x_min = self.grid[0][1] - pen_size
+        self.pen_y_min = self.grid[1][1] - pen_size
+        self.pen_x_max = self.grid[0][1]
+        self.pen_y_max = self.grid[1][1]
+        self.pen_center_x = self.pen_x_min + pen_size/2
+        self.pen_center_y = self.pen_y_min + pen_size/2
+
+        # Wolf pens in the top left and bottom left corners
+        self.wolf_pen_locations = [
+            (self.grid[0][0] + pen_size/4, self.grid[0][1] - pen_size/4),
+            (self.grid[0][0] + pen_size/4, self.grid[1][0] + pen_size/4),
+        ]
+
+    @staticmethod
+    def create_grid(size):
+        grid = [
+            [-(size/2), (size/2)],  # xmin, xmax
+            [-(size/2), (size/2)]  # ymin, ymax
+        ]
+
+        return grid
+
+    def wolf_pen_location(self, wolf_index):
+        # Wolves beyond the second share the pens in turn
+        return self.wolf_pen_locations[wolf_index % len(self.wolf_pen_locations)]
@@ -0,0 +1,116 @@
+import rclpy
+from rclpy.executors import SingleThreadedExecutor
+from rclpy.task import Future
+from sheep_simulation_interfaces.srv import EntitySpawn, GenerateFlock
+from sheep_simulation.arena import Arena
+from sheep_simulation.master_node import MasterSimulationNode
+from sheep_simulation.sheep_node import SheepSimulationNode
+from sheep_simulation.wolf_node import WolfSimulationNode
+
+
+# rclpy has no intra-process transport (use_intra_process_comms is rclcpp only),
+# so the composed layout wires the nodes together itself. Simulation state is
+# shared by reference, messages between the nodes are handed over as Python
+# objects, and only topics with subscribers outside this process go through DDS.
+
+
+class LocalPublisher():
+    """Publisher stand-in that calls in-process subscribers directly.
+
+    The message object is passed by reference, so nothing is serialized or
+    copied. DDS is only used when something outside the process (RViz, a
+    recorder) is subscribed.
+    """
+
+    def __init__(self, publisher, callbacks):
+        self.publisher = publisher
+        self.callbacks = callbacks
+
+    def publish(self, msg):
+        for callback in self.callbacks:
+            callback(msg)
+
+        if self.publisher.get_subscription_count() > 0:
+            self.publisher.publish(msg)
+
+    def get_subscription_count(self):
+        return self.publisher.get_subscription_count()
+
+
+class LocalClient():
+    """Service client stand-in that calls an in-process service callback directly."""
+
+    def __init__(self, srv_type, callback):
+        self.srv_type = srv_type
+        self.callback = callback
+
+    def wait_for_service(self, timeout_sec=None):
+        return True
+
+    def service_is_ready(self):
+        return True
+
+    def call_async(self, request):
+        future = Future()
+        future.set_result(self.callback(request, self.srv_type.Response()))
+        return future
+
+
+def compose(master, sheep, wolf):
+    """Wire the three nodes together in-process. The master must be created with spawn=False."""
+    # One arena object for both populations, built from the master's grid
+    arena = Arena(master.grid, master.pen_size)
+    sheep.destroy_subscription(sheep.grid_subscription)
+    sheep.set_arena(arena)
+    wolf.destroy_subscription(wolf.grid_subscription)
+    wolf.set_arena(arena)
+
+    # Each node reads the other population's poses straight from its store instead of a pose topic
+    sheep.destroy_subscription(sheep.wolf_position_subscription)
+    sheep.wolves = wolf.wolves
+    wolf.destroy_subscription(wolf.sheep_position_subscription)
+    wolf.sheep_positions = sheep.sheep
+    wolf.pack.sheep = sheep.sheep
+
+    wolf.destroy_subscription(wolf.pen_occupancy_subscription)
+    sheep.pen_occupancy_publisher = LocalPublisher(sheep.pen_occupancy_publisher, [wolf.pen_occupancy_callback])
+
+    # The master keeps consuming pose blocks for the markers, but gets them by reference
+    sheep_pose_callbacks, wolf_pose_callbacks = [], []
+    if master.visualization:
+        master.destroy_subscription(master.sheep_position_subscription)
+        master.destroy_subscription(master.wolf_position_subscription)
+        sheep_pose_callbacks.append(master.sheep_position_callback)
+        wolf_pose_callbacks.append(master.wolf_position_callback)
+    sheep.sheep_pose_block_publisher = LocalPublisher(sheep.sheep_pose_block_publisher, sheep_pose_callbacks)
+    wolf.wolf_pose_block_publisher = LocalPublisher(wolf.wolf_pose_block_publisher, wolf_pose_callbacks)
+
+    # Spawning calls the services in-process, so nothing blocks on discovery
+    master.sheep_spawn_client = LocalClient(EntitySpawn, sheep.sheep_spawn_callback)
+    master.generate_flock_client = LocalClient(GenerateFlock, sheep.generate_flock_callback)
+    master.wolf_spawn_client = LocalClient(EntitySpawn, wolf.wolf_spawn_callback)
+    master.spawn_entities().add_done_callback(master.startup_complete)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    # The grid and the spawns are handed over by compose rather than waited for
+    master = MasterSimulationNode(spawn=False)
+    sheep = SheepSimulationNode()
+    wolf = WolfSimulationNode()
+    compose(master, sheep, wolf)
+
+    executor = SingleThreadedExecutor()
+    for node in (master, sheep, wolf):
+        executor.add_node(node)
+
+    try:
+        executor.spin()
+    finally:
+        sheep.stop_recording()
+        wolf.stop_recording()
+        executor.shutdown()
+        for node in (master, sheep, wolf):
+            node.destroy_node()
+        rclpy.shutdown()
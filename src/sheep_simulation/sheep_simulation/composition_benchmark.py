@@ -0,0 +1,132 @@
+import argparse
+import json
+import resource
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from sheep_simulation_interfaces.msg import PoseBlock
+
+
+# The simulation processes for each deployment layout
+LAYOUTS = {
+    "multi": [
+        ["ros2", "run", "sheep_simulation", "master_node"],
+        ["ros2", "run", "sheep_simulation", "sheep_node"],
+        ["ros2", "run", "sheep_simulation", "wolf_node"]
+    ],
+    "composed": [
+        ["ros2", "run", "sheep_simulation", "composed"]
+    ]
+}
+
+
+class PoseProbe(Node):
+    """Records when each sheep pose block was stamped and when it arrived here."""
+
+    def __init__(self):
+        super().__init__("composition_benchmark_probe")
+        self.stamps = []
+        self.arrivals = []
+        self.seqs = []
+        self.create_subscription(PoseBlock, "sheep_simulation/sheep/pose_block", self.pose_callback, 10)
+
+    def pose_callback(self, msg):
+        self.arrivals.append(self.get_clock().now().nanoseconds)
+        self.stamps.append(msg.header.stamp.sec * 1_000_000_000 + msg.header.stamp.nanosec)
+        self.seqs.append(msg.seq)
+
+
+def percentiles(values_ms):
+    if len(values_ms) == 0:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def run_layout(name, probe, duration, timeout, ros_args):
+    """Run one layout for duration seconds of simulation and summarise it.
+
+    The layout fails if no pose block arrives within timeout seconds of starting it.
+    """
+    probe.stamps, probe.arrivals, probe.seqs = [], [], []
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    processes = [subprocess.Popen(command + ["--ros-args"] + ros_args) for command in LAYOUTS[name]]
+    try:
+        # Measure from the first pose block, so startup and spawning are left out
+        start = time.monotonic()
+        while not probe.arrivals and time.monotonic() - start < timeout:
+            rclpy.spin_once(probe, timeout_sec=0.1)
+        start = time.monotonic()
+        while probe.arrivals and time.monotonic() - start < duration:
+            rclpy.spin_once(probe, timeout_sec=0.1)
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+
+    # Children are only accounted for once they have been waited on
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+
+    latencies = (np.array(probe.arrivals) - np.array(probe.stamps)) / 1e6
+    periods = np.diff(np.array(probe.arrivals)) / 1e6
+    seqs = np.array(probe.seqs)
+    return {
+        "layout": name,
+        "failed": not probe.arrivals,
+        "blocks": len(seqs),
+        "missed_blocks": int(np.sum(np.maximum(np.diff(seqs) - 1, 0))) if len(seqs) > 1 else 0,
+        "pose_latency_ms": percentiles(latencies),
+        "tick_period_ms": percentiles(periods),
+        # CPU of the simulation processes over the whole run, startup included
+        "cpu_seconds": cpu
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare tick latency and CPU use of the multi-process and composed layouts")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to measure each layout for")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the first pose block before a layout counts as failed")
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--ros-args", dest="ros_args", nargs=argparse.REMAINDER, default=[], help="passed on to every simulation process, e.g. -p visualization:=false")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(args)
+
+    rclpy.init()
+    probe = PoseProbe()
+    results = []
+    try:
+        for name in args.layouts:
+            result = run_layout(name, probe, args.duration, args.timeout, args.ros_args)
+            results.append(result)
+            if result["failed"]:
+                print(f"{name:<9} failed, no pose block within {args.timeout} s")
+                continue
+            print(
+                f"{name:<9} blocks {result['blocks']:>5} (missed {result['missed_blocks']}), "
+                f"pose latency p50 {result['pose_latency_ms']['p50']:.2f} ms p99 {result['pose_latency_ms']['p99']:.2f} ms, "
+                f"tick period p99 {result['tick_period_ms']['p99']:.1f} ms, cpu {result['cpu_seconds']:.1f} s"
+            )
+    finally:
+        probe.destroy_node()
+        rclpy.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    failed = [r["layout"] for r in results if r["failed"]]
+    if failed:
+        print(f"layouts that never published poses: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
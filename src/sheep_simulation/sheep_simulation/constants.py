@@ -0,0 +1,5 @@
+# Behaviour constants shared by the simulation and the nodes that only draw
+# it, so those can use them without importing the simulation classes
+
+# Sheep flee from wolves closer than this
+WOLF_FLEE_DIST = 10.0
@@ -0,0 +1,113 @@
+import contextlib
+import os
+import tempfile
+import time
+
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from sheep_simulation_interfaces.srv import ProfileTicks
+from sheep_simulation.profiling import PERCENTILES, PhaseTimer, TickProfiler
+
+
+# Phase timings of the simulation nodes as diagnostic_msgs on /diagnostics,
+# readable with rqt_runtime_monitor or `ros2 topic echo /diagnostics`
+
+class NodeProfiling():
+    """Phase timers, /diagnostics publishing and the profile service of one simulation node.
+
+    Wrap each tick in tick() and its phases in phases.time(name). With a
+    tick_period the node reports WARN once the p95 tick takes longer.
+    """
+
+    def __init__(self, node, name, tick_period=None):
+        self.node = node
+        self.name = name
+        self.tick_period = tick_period
+
+        node.declare_parameter("diagnostics_rate", 1.0)  # Hz, 0 to not publish phase timings
+        node.declare_parameter("profile_window", 1000)  # Samples per phase the percentiles are taken over
+        node.declare_parameter("profile_directory", "")  # Where profile snapshots go when no path is given, empty for the temp directory
+        self.directory = node.get_parameter("profile_directory").value or tempfile.gettempdir()
+
+        self.phases = PhaseTimer(window=max(1, node.get_parameter("profile_window").value))
+        self.profiler = TickProfiler()
+        self.profile_error = None  # Why the last profile couldn't be written, reported in the diagnostics
+        self.tick_timing = self.phases.time("tick")
+
+        self.diagnostics_publisher = node.create_publisher(DiagnosticArray, 'diagnostics', 10)
+        diagnostics_rate = node.get_parameter("diagnostics_rate").value
+        if diagnostics_rate > 0:
+            self.diagnostics_timer = node.create_timer(1.0 / diagnostics_rate, self.publish_diagnostics)
+
+        self.profile_service = node.create_service(ProfileTicks, f"sheep_simulation/{name}/profile", self.profile_callback)
+
+    @contextlib.contextmanager
+    def tick(self):
+        with self.tick_timing:
+            yield
+        path = self.profiler.path
+        try:
+            path = self.profiler.tick_done()
+        except OSError as error:
+            self.profile_error = f"could not write {path}: {error}"
+            self.node.get_logger().error(f"Profile failed, {self.profile_error}")
+            return
+        if path is not None:
+            self.profile_error = None
+            self.node.get_logger().info(f"Profile written to {path}")
+
+    def profile_callback(self, request, response):
+        if self.profiler.active:
+            response.success = False
+            response.message = f"already profiling, {self.profiler.remaining} ticks to go"
+            response.path = self.profiler.path
+            return response
+        if request.ticks == 0:
+            response.success = False
+            response.message = "ticks must be at least 1"
+            return response
+
+        path = request.path or os.path.join(self.directory, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+        try:
+            self.profiler.start(request.ticks, path)
+        except ValueError as error:
+            # Another node composed into this process, or another profiling tool, holds cProfile
+            response.success = False
+            response.message = str(error)
+            return response
+        response.success = True
+        response.message = f"profiling the next {request.ticks} ticks"
+        response.path = path
+        return response
+
+    def diagnostic_status(self):
+        status = DiagnosticStatus()
+        status.name = f"sheep_simulation: {self.node.get_name()}"
+        status.hardware_id = "sheep_simulation"
+        status.level = DiagnosticStatus.OK
+        status.message = "no ticks yet"
+
+        for phase in self.phases.samples:
+            percentiles = self.phases.percentiles(phase)
+            if percentiles is None:
+                continue
+            status.values.append(KeyValue(key=f"{phase} count", value=str(self.phases.counts[phase])))
+            for q, seconds in zip(PERCENTILES, percentiles.tolist()):
+                status.values.append(KeyValue(key=f"{phase} p{q} ms", value=f"{seconds * 1000:.3f}"))
+
+        tick = self.phases.percentiles("tick")
+        if tick is not None:
+            p95 = tick[1]
+            status.message = f"p95 tick {p95 * 1000:.1f} ms"
+            if self.tick_period is not None and p95 > self.tick_period:
+                status.level = DiagnosticStatus.WARN
+                status.message += f", behind the {self.tick_period * 1000:.0f} ms timer"
+        if self.profile_error is not None:
+            status.level = DiagnosticStatus.WARN
+            status.message += f", profile failed: {self.profile_error}"
+        return status
+
+    def publish_diagnostics(self):
+        msg = DiagnosticArray()
+        msg.header.stamp = self.node.get_clock().now().to_msg()
+        msg.status = [self.diagnostic_status()]
+        self.diagnostics_publisher.publish(msg)
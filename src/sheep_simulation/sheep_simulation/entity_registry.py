@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class EntityRegistry():
+    """Dense integer handles for named entities.
+
+    Handles are assigned in spawn order starting at 0 and are never reused, so
+    they index straight into per-entity NumPy arrays. Names are only needed at
+    the boundary, for spawning, display and logging.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def handle(self, name):
+        return self.index[name]
+
+    def name(self, handle):
+        return self.names[handle]
+
+    def register(self, names):
+        """Handles for names, registering the ones not seen before. Returns an intp array."""
+        handles = np.empty(len(names), dtype=np.intp)
+        for i, name in enumerate(names):
+            handle = self.index.get(name)
+            if handle is None:
+                handle = len(self.names)
+                self.index[name] = handle
+                self.names.append(name)
+            handles[i] = handle
+        return handles
+
+    def grow(self, count):
+        """Make room for handles below count, e.g. ones seen in a pose block before their names."""
+        if count > len(self.names):
+            self.names.extend([None] * (count - len(self.names)))
+
+    def assign(self, handles, names):
+        """Record names under handles assigned elsewhere, as a mirror of another node's registry."""
+        handles = [int(handle) for handle in handles]
+        if handles:
+            self.grow(max(handles) + 1)
+        for handle, name in zip(handles, names):
+            self.names[handle] = name
+            self.index[name] = handle
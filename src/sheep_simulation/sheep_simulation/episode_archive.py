@@ -0,0 +1,203 @@
+import json
+import os
+
+import numpy as np
+
+
+# Archive layout, one directory:
+#   ep<episode>_<n>.npz  compressed chunk of up to chunk_ticks ticks of one episode, one float32
+#                        [ticks, N] array per population and field, e.g. sheep_x or wolves_theta
+#   episodes.jsonl       metadata table, one row per episode
+#   index.jsonl          one row per chunk: episode, first tick, end tick and file
+# Tick 0 of an episode is the spawn layout, tick t the state after t steps.
+
+POPULATIONS = ("sheep", "wolves")
+FIELDS = ("x", "y", "theta")
+
+
+class EpisodeWriter():
+    """Writes one episode's poses into an archive directory, chunk by chunk.
+
+    Has the same record()/close() interface as TrajectoryRecorder, so it goes
+    into SimulationEngine.recorders. Only the current chunk is held in memory.
+    Several writers can fill one archive in parallel, each episode has its
+    own chunk files and the index rows close() returns are added by
+    EpisodeArchiveWriter.
+    """
+
+    def __init__(self, directory, episode, sheep, wolves, wolf_names=None, chunk_ticks=256, idle_distance=1e-3):
+        self.directory = directory
+        self.episode = episode
+        self.stores = {"sheep": sheep, "wolves": wolves}
+        self.wolf_names = list(wolves.names) if wolf_names is None else wolf_names
+        self.chunk_ticks = chunk_ticks
+        self.idle_distance = idle_distance
+        os.makedirs(directory, exist_ok=True)
+
+        self.tick = 0
+        self.chunk_start = 0
+        self.chunks = []
+        self.columns = {}
+        self.allocate()
+
+        # A wolf idles in a tick it moves less than idle_distance
+        self.last_wolf_x = np.array(wolves.x)
+        self.last_wolf_y = np.array(wolves.y)
+        self.wolf_idle_ticks = np.zeros(len(wolves), dtype=np.int64)
+
+        self.record()
+
+    def allocate(self):
+        # Chunk buffers sized for the current populations, reused from chunk to chunk
+        self.counts = {population: len(store) for population, store in self.stores.items()}
+        self.columns = {
+            f"{population}_{field}": np.zeros((self.chunk_ticks, self.counts[population]), dtype=np.float32)
+            for population in POPULATIONS for field in FIELDS
+        }
+
+    def record(self):
+        # A spawn or a full chunk starts the next one
+        resized = any(len(store) != self.counts[population] for population, store in self.stores.items())
+        if resized or self.tick - self.chunk_start == self.chunk_ticks:
+            self.flush_chunk()
+            if resized:
+                self.allocate()
+
+        row = self.tick - self.chunk_start
+        for population, store in self.stores.items():
+            self.columns[f"{population}_x"][row] = store.x
+            self.columns[f"{population}_y"][row] = store.y
+            self.columns[f"{population}_theta"][row] = store.theta
+
+        wolves = self.stores["wolves"]
+        if len(wolves) == len(self.wolf_idle_ticks) and self.tick > 0:
+            self.wolf_idle_ticks += np.hypot(wolves.x - self.last_wolf_x, wolves.y - self.last_wolf_y) < self.idle_distance
+            self.last_wolf_x[:] = wolves.x
+            self.last_wolf_y[:] = wolves.y
+        self.tick += 1
+
+    def flush_chunk(self):
+        ticks = self.tick - self.chunk_start
+        if ticks == 0:
+            return
+
+        file = f"ep{self.episode:06d}_{len(self.chunks):05d}.npz"
+        np.savez_compressed(os.path.join(self.directory, file), **{name: column[:ticks] for name, column in self.columns.items()})
+        self.chunks.append({"episode": self.episode, "start": self.chunk_start, "stop": self.tick, "file": file})
+        self.chunk_start = self.tick
+
+    def close(self):
+        """Write the last chunk. Returns the index rows and the per-episode metadata gathered while recording."""
+        self.flush_chunk()
+        return {
+            "chunks": self.chunks,
+            "metadata": {
+                "recorded_ticks": self.tick,
+                "chunk_ticks": self.chunk_ticks,
+                "wolf_idle_ticks": dict(zip(self.wolf_names, self.wolf_idle_ticks.tolist()))
+            }
+        }
+
+
+class EpisodeArchiveWriter():
+    """Appends finished episodes to the metadata table and the chunk index of an archive."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.episodes = open(os.path.join(directory, "episodes.jsonl"), "a")
+        self.index = open(os.path.join(directory, "index.jsonl"), "a")
+
+    def add(self, metadata, archived):
+        """metadata is any per-episode summary with an "episode" key, archived is what EpisodeWriter.close returned."""
+        for chunk in archived["chunks"]:
+            self.index.write(json.dumps(chunk) + "\n")
+        self.episodes.write(json.dumps({**metadata, **archived["metadata"]}) + "\n")
+        # An episode is listed only once its chunks are
+        self.index.flush()
+        self.episodes.flush()
+
+    def close(self):
+        self.index.close()
+        self.episodes.close()
+
+
+class EpisodeArchive():
+    """Streaming reader for an archive. Only the chunks a query touches are loaded, one at a time."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "episodes.jsonl")) as file:
+            self.episodes = {row["episode"]: row for row in map(json.loads, file)}
+
+        # Per episode, chunk start ticks in order for a binary search, and their rows
+        chunks = {}
+        with open(os.path.join(directory, "index.jsonl")) as file:
+            for row in map(json.loads, file):
+                if row["episode"] in self.episodes:
+                    chunks.setdefault(row["episode"], []).append(row)
+        self.chunks = {episode: sorted(rows, key=lambda row: row["start"]) for episode, rows in chunks.items()}
+        self.chunk_starts = {episode: np.array([row["start"] for row in rows]) for episode, rows in self.chunks.items()}
+
+        self.open_file = None
+        self.open_chunk = None
+        self.open_columns = {}
+
+    def __len__(self):
+        return len(self.episodes)
+
+    def column(self, name):
+        """One metadata field across all episodes, in episode order."""
+        return np.array([self.episodes[episode][name] for episode in sorted(self.episodes)])
+
+    def select(self, predicate):
+        """Episodes whose metadata row passes predicate, e.g. lambda e: e["wolf_idle_ticks"]["wolf2"] > 100."""
+        return [episode for episode in sorted(self.episodes) if predicate(self.episodes[episode])]
+
+    def chunk(self, episode, tick):
+        """Index row of the chunk holding tick of episode, None past the end of the episode or for an unknown episode."""
+        starts = self.chunk_starts.get(episode)
+        if starts is None:
+            return None
+        i = int(np.searchsorted(starts, tick, side="right")) - 1
+        if i < 0:
+            return None
+        row = self.chunks[episode][i]
+        return row if tick < row["stop"] else None
+
+    def read(self, row, name):
+        # Only the last chunk stays open, and only the columns read from it are decompressed, once each
+        if self.open_chunk is not row:
+            self.close()
+            self.open_file = np.load(os.path.join(self.directory, row["file"]))
+            self.open_chunk = row
+        if name not in self.open_columns:
+            self.open_columns[name] = self.open_file[name]
+        return self.open_columns[name]
+
+    def frame(self, episode, tick, populations=POPULATIONS):
+        """{population: [N,3] float32} poses at one tick, None if the episode has no such tick."""
+        row = self.chunk(episode, tick)
+        if row is None:
+            return None
+        i = tick - row["start"]
+        return {population: np.column_stack([self.read(row, f"{population}_{field}")[i] for field in FIELDS]) for population in populations}
+
+    def at_tick(self, tick, episodes=None, populations=POPULATIONS):
+        """Yield (episode, frame) for tick across episodes (all by default), skipping episodes that ended earlier."""
+        for episode in sorted(self.episodes) if episodes is None else episodes:
+            frame = self.frame(episode, tick, populations)
+            if frame is not None:
+                yield episode, frame
+
+    def iter_chunks(self, episode, columns=None):
+        """Yield (start tick, {column: [ticks, N] float32}) chunk by chunk, only loading the columns asked for."""
+        columns = [f"{population}_{field}" for population in POPULATIONS for field in FIELDS] if columns is None else columns
+        for row in self.chunks.get(episode, []):
+            yield row["start"], {name: self.read(row, name) for name in columns}
+
+    def close(self):
+        if self.open_file is not None:
+            self.open_file.close()
+            self.open_file = None
+            self.open_chunk = None
+            self.open_columns = {}
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+# Sheep spawn facing theta 0, as they always have, layouts only place them
+
+
+def uniform_flock(count, grid, rng):
+    """[count,3] array of (x, y, theta) spread evenly over the grid."""
+    x = rng.uniform(grid[0][0], grid[0][1], count)
+    y = rng.uniform(grid[1][0], grid[1][1], count)
+    return np.column_stack([x, y, np.zeros(count)])
+
+
+def clustered_flock(count, grid, rng, clusters=4, spread=2.0):
+    """[count,3] array of (x, y, theta) packed into a few tight gaussian clusters."""
+    centres = uniform_flock(clusters, grid, rng)[:, :2]
+    members = rng.integers(0, clusters, count)
+
+    xy = centres[members] + rng.normal(0.0, spread, (count, 2))
+    xy[:, 0] = np.clip(xy[:, 0], grid[0][0], grid[0][1])
+    xy[:, 1] = np.clip(xy[:, 1], grid[1][0], grid[1][1])
+    return np.column_stack([xy, np.zeros(count)])
+
+
+FLOCK_LAYOUTS = {
+    "uniform": uniform_flock,
+    "clustered": clustered_flock,
+}
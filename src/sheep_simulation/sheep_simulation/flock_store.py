@@ -0,0 +1,91 @@
+import numpy as np
+
+from sheep_simulation.entity_registry import EntityRegistry
+
+
+class FlockStore():
+    """Struct-of-arrays pose store for a population of named entities.
+
+    Poses live in contiguous float32 x, y and theta arrays so a tick can update
+    the whole population with array operations. An entity's index is its
+    EntityRegistry handle, names are kept in the registry. Capacity doubles
+    when full, so spawning is amortised O(1) per entity.
+    """
+
+    def __init__(self, capacity=64, registry=None):
+        self.registry = EntityRegistry() if registry is None else registry
+        self.count = 0
+
+        self._x = np.zeros(capacity, dtype=np.float32)
+        self._y = np.zeros(capacity, dtype=np.float32)
+        self._theta = np.zeros(capacity, dtype=np.float32)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, name):
+        return name in self.registry
+
+    @property
+    def names(self):
+        return self.registry.names
+
+    @property
+    def index(self):
+        return self.registry.index
+
+    # Views over the live part of the arrays, writes go straight to the store
+    @property
+    def x(self):
+        return self._x[:self.count]
+
+    @property
+    def y(self):
+        return self._y[:self.count]
+
+    @property
+    def theta(self):
+        return self._theta[:self.count]
+
+    def reserve(self, capacity):
+        if capacity <= len(self._x):
+            return
+
+        capacity = max(capacity, 2 * len(self._x))
+        for field in ("_x", "_y", "_theta"):
+            grown = np.zeros(capacity, dtype=np.float32)
+            grown[:self.count] = getattr(self, field)[:self.count]
+            setattr(self, field, grown)
+
+    def add(self, name, x, y, theta):
+        """Add one entity, or move it if the name is already known. Returns its index."""
+        return self.extend([name], [x], [y], [theta])[0]
+
+    def extend(self, names, x, y, theta):
+        """Add a batch of entities, known names are moved instead. Returns their indices."""
+        indices = self.registry.register(names)
+
+        self.reserve(len(self.registry))
+        self.count = len(self.registry)
+
+        self._x[indices] = x
+        self._y[indices] = y
+        self._theta[indices] = theta
+        return indices
+
+    def assign(self, indices, x, y, theta):
+        """Write poses by index, e.g. from a pose block. Indices past the end grow the store, their names stay None."""
+        indices = np.asarray(indices, dtype=np.intp)
+        if len(indices) > 0 and indices.max() >= self.count:
+            count = int(indices.max()) + 1
+            self.reserve(count)
+            self.registry.grow(count)
+            self.count = count
+
+        self._x[indices] = x
+        self._y[indices] = y
+        self._theta[indices] = theta
+
+    def poses(self):
+        """[N,3] float64 array of (x, y, theta) rows."""
+        return np.column_stack([self.x, self.y, self.theta]).astype(float)
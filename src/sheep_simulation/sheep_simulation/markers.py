@@ -0,0 +1,141 @@
+from visualization_msgs.msg import Marker, MarkerArray
+from geometry_msgs.msg import Point
+from std_msgs.msg import ColorRGBA
+from sheep_simulation.constants import WOLF_FLEE_DIST
+import numpy as np
+
+
+# RViz markers for the simulation, shared by the master node and the replay node
+
+# "entities" keeps one SPHERE marker per entity, the others draw each population as a single marker
+MARKER_MODES = ["entities", "sphere_list", "points"]
+
+# Sheep states shown by per-point colors in the single marker modes
+GRAZING, FLEEING, PENNED = 0, 1, 2
+SHEEP_STATE_COLORS = {
+    GRAZING: (0.0, 1.0, 0.0),  # green, same as the per-entity markers
+    FLEEING: (1.0, 0.6, 0.0),  # orange
+    PENNED: (0.0, 0.6, 1.0)  # light blue
+}
+# One message per color, shared by every point in that state
+SHEEP_STATE_RGBA = {state: ColorRGBA(r=r, g=g, b=b, a=1.0) for state, (r, g, b) in SHEEP_STATE_COLORS.items()}
+
+
+def create_marker(entity_type, name):
+    marker = Marker()
+    marker.header.frame_id = "map"
+    marker.ns = name
+    marker.id = 0
+    marker.type = Marker.SPHERE
+    marker.action = Marker.ADD
+    marker.scale.x = 0.5
+    marker.scale.y = 0.5
+    marker.scale.z = 0.5
+    marker.color.a = 1.0
+
+    if entity_type == "sheep":  # Green for sheep
+        marker.color.r = 0.0
+        marker.color.g = 1.0
+        marker.color.b = 0.0
+    elif entity_type == "wolf":  # Red for wolf
+        marker.color.r = 1.0
+        marker.color.g = 0.0
+        marker.color.b = 0.0
+
+    return marker
+
+
+def create_pen_marker(grid, name, size=10.0):
+    marker = Marker()
+    marker.header.frame_id = "map"
+    marker.ns = name
+    marker.id = 0
+    marker.type = Marker.CUBE
+    marker.action = Marker.ADD
+    marker.scale.x = size
+    marker.scale.y = size
+    marker.scale.z = 0.1
+
+    if name == "sheep_pen":
+        marker.pose.position.x = grid[0][1] - (size/2)
+        marker.pose.position.y = grid[1][1] - (size/2)
+        marker.pose.position.z = 0.0
+        marker.color.a = 0.5
+        marker.color.r = 0.0
+        marker.color.g = 0.0
+        marker.color.b = 1.0
+
+    elif name == "wolf_pen1":
+        marker.pose.position.x = grid[0][0] + (size/2)
+        marker.pose.position.y = grid[1][1] - (size/2)
+        marker.pose.position.z = 0.0
+        marker.color.a = 0.5
+        marker.color.r = 0.5
+        marker.color.g = 0.0
+        marker.color.b = 0.0
+
+    elif name == "wolf_pen2":
+        marker.pose.position.x = grid[0][0] + (size/2)
+        marker.pose.position.y = grid[0][0] + (size/2)
+        marker.pose.position.z = 0.0
+        marker.color.a = 0.5
+        marker.color.r = 0.5
+        marker.color.g = 0.0
+        marker.color.b = 0.0
+
+    return marker
+
+
+def pen_markers(grid, pen_size):
+    msg = MarkerArray()
+    msg.markers = [
+        create_pen_marker(grid, "sheep_pen", size=pen_size),
+        create_pen_marker(grid, "wolf_pen1", size=pen_size / 2),
+        create_pen_marker(grid, "wolf_pen2", size=pen_size / 2)
+    ]
+    return msg
+
+
+def in_pen(grid, pen_size, x, y):
+    # Works on scalars and on numpy arrays
+    return (x >= grid[0][1] - pen_size) & (y >= grid[1][1] - pen_size)
+
+
+def sheep_states(grid, pen_size, sheep_x, sheep_y, wolf_x, wolf_y):
+    # Fleeing uses the same rule as the sheep node: a wolf within WOLF_FLEE_DIST
+    states = np.full(len(sheep_x), GRAZING)
+    if len(wolf_x) > 0 and len(sheep_x) > 0:
+        squared_distances = (sheep_x[:, None] - wolf_x[None, :]) ** 2 + (sheep_y[:, None] - wolf_y[None, :]) ** 2
+        states[squared_distances.min(axis=1) < WOLF_FLEE_DIST ** 2] = FLEEING
+    states[in_pen(grid, pen_size, sheep_x, sheep_y)] = PENNED
+    return states
+
+
+class PopulationMarker():
+    """The whole population as one SPHERE_LIST/POINTS marker instead of a marker per entity.
+
+    The marker and its points are kept between ticks and only moved, so
+    update() returns the same MarkerArray every time. It belongs to the
+    owner of the PopulationMarker and is only valid until the next update.
+    """
+
+    def __init__(self, entity_type, marker_mode):
+        self.marker = create_marker(entity_type, entity_type)
+        self.marker.type = Marker.POINTS if marker_mode == "points" else Marker.SPHERE_LIST
+        self.marker.pose.orientation.w = 1.0
+        self.points = []
+        self.msg = MarkerArray()
+        self.msg.markers = [self.marker]
+
+    def update(self, x, y, states=None):
+        # Points are only created or dropped when the population changes size
+        points = self.points
+        del points[len(x):]
+        points.extend(Point(z=0.0) for _ in range(len(x) - len(points)))
+        for point, px, py in zip(points, x.tolist(), y.tolist()):
+            point.x = px
+            point.y = py
+        self.marker.points = points
+
+        self.marker.colors = [SHEEP_STATE_RGBA[state] for state in states.tolist()] if states is not None else []
+        return self.msg
@@ -1,72 +1,186 @@
+import collections
+import time
+
 import rclpy
 from rclpy.node import Node
-from visualization_msgs.msg import Marker, MarkerArray
-from sheep_simulation_interfaces.msg import EntityPose, EntityPoseArray
-from sheep_simulation_interfaces.srv import EntitySpawn, Grid
-import random
+from rclpy.task import Future
+from visualization_msgs.msg import MarkerArray
+from sheep_simulation_interfaces.msg import EntityPose, Grid, PoseBlock
+from sheep_simulation_interfaces.srv import EntityNames, EntitySpawn, GenerateFlock
+from sheep_simulation.diagnostics import NodeProfiling
+from sheep_simulation.entity_registry import EntityRegistry
+from sheep_simulation.flock_layout import FLOCK_LAYOUTS
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.markers import MARKER_MODES, create_marker, create_pen_marker, in_pen, pen_markers, PopulationMarker, sheep_states
+from sheep_simulation.pose_stream import PoseStream
+from sheep_simulation.qos import declare_qos_parameter, qos_profile
+from std_srvs.srv import Trigger
+from sheep_simulation.rng import MASTER_STREAM, make_rng
+import numpy as np
 import math
 
 
 class MasterSimulationNode(Node):
-    def __init__(self):
+    def __init__(self, spawn=True):
         super().__init__('master_simulation_node')
-
-        # simulation markers
-        self.sheep_markers = {}
-        self.sheep_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/sheep_markers', 10)
-        self.wolf_markers = {}
-        self.wolf_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/wolf_markers', 10)
-
-        self.pen_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/pen_markers', 10)
-
-        # Services
-        self.grid_init_service = self.create_service(Grid, "sheep_simulation/grid", self.grid_init_callback)
+        self.startup_start = time.monotonic()
+
+        # Seeded spawning, negative seed for an unseeded run
+        self.declare_parameter("seed", -1)
+        self.seed = self.get_parameter("seed").value
+        self.rng = make_rng(self.seed, MASTER_STREAM)
+
+        # Flock size and how it is spawned
+        self.declare_parameter("sheep_count", 100)  # Split over two groups
+        self.declare_parameter("flock_distribution", "uniform")  # One of FLOCK_LAYOUTS
+        self.declare_parameter("spawn_mode", "request")  # "request" sends every pose, "generate" has the sheep node draw the flock from the seed
+        self.declare_parameter("spawn_chunk_size", 1000)  # Sheep per spawn request
+        self.declare_parameter("spawn_max_inflight", 4)  # Spawn requests sent before waiting for a reply
+        self.sheep_count = self.get_parameter("sheep_count").value
+        self.flock_distribution = self.get_parameter("flock_distribution").value
+        if self.flock_distribution not in FLOCK_LAYOUTS:
+            raise ValueError(f"unknown flock distribution '{self.flock_distribution}', expected one of {list(FLOCK_LAYOUTS)}")
+        self.spawn_mode = self.get_parameter("spawn_mode").value
+        if self.spawn_mode not in ("request", "generate"):
+            raise ValueError(f"unknown spawn mode '{self.spawn_mode}', expected 'request' or 'generate'")
+        self.spawn_chunk_size = max(1, self.get_parameter("spawn_chunk_size").value)
+        self.spawn_max_inflight = max(1, self.get_parameter("spawn_max_inflight").value)
+
+        self.declare_parameter("marker_mode", "sphere_list")  # One of MARKER_MODES
+        self.declare_parameter("marker_state_colors", True)  # Color sheep by state in the single marker modes
+        self.marker_mode = self.get_parameter("marker_mode").value
+        if self.marker_mode not in MARKER_MODES:
+            raise ValueError(f"unknown marker mode '{self.marker_mode}', expected one of {MARKER_MODES}")
+        self.marker_state_colors = self.get_parameter("marker_state_colors").value
+        self.population_markers = {}  # PopulationMarker per entity type, made on first use in the single marker modes
+
+        self.declare_parameter("visualization", True)  # False for headless runs, no markers are published at all
+        self.declare_parameter("max_viz_rate", 10.0)  # Hz, pose updates in between are coalesced, 0 for no limit
+        self.visualization = self.get_parameter("visualization").value
+        max_viz_rate = self.get_parameter("max_viz_rate").value
+
+        # Phase timings on /diagnostics and cProfile snapshots, see diagnostics.py. A master tick is one marker update
+        self.profiling = NodeProfiling(self, "master", tick_period=1.0 / max_viz_rate if max_viz_rate > 0 else None)
+        self.phases = self.profiling.phases
+
+        # QoS presets, see qos.py
+        pose_qos = declare_qos_parameter(self, "pose_qos")
+        marker_qos = declare_qos_parameter(self, "marker_qos")
+        pen_qos = declare_qos_parameter(self, "pen_qos", "latched")
+
+        # Mirrors of the sheep and wolf nodes' entity handles, names are only needed for marker namespaces
+        self.sheep_registry = EntityRegistry()
+        self.wolf_registry = EntityRegistry()
+
+        # simulation markers, indexed by entity handle, None until the entity's name is known
+        self.sheep_markers = []
+        self.sheep_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/sheep_markers', marker_qos)
+        self.wolf_markers = []
+        self.wolf_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/wolf_markers', marker_qos)
+
+        # Pens are latched by default, published once and again only when the grid changes
+        self.pen_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/pen_markers', pen_qos)
+
+        # The grid is published once and latched, so nodes that start later still get it
+        self.grid_publisher = self.create_publisher(Grid, 'sheep_simulation/grid', qos_profile("latched"))
 
         # clients to spawn entities
         self.sheep_spawn_client = self.create_client(EntitySpawn, 'sheep_simulation/sheep/spawn')
-        while not self.sheep_spawn_client.wait_for_service(timeout_sec=1.0):
-            self.get_logger().info('Waiting for sheep /spawn service...')
-        self.sheep_spawn_request = EntitySpawn.Request()
+        self.generate_flock_client = self.create_client(GenerateFlock, 'sheep_simulation/sheep/generate')
 
         self.wolf_spawn_client = self.create_client(EntitySpawn, 'sheep_simulation/wolf/spawn')
-        while not self.wolf_spawn_client.wait_for_service(timeout_sec=1.0):
-            self.get_logger().info('Waiting for wolf /spawn service...')
-        self.wolf_spawn_request = EntitySpawn.Request()
 
-        # subcribe to entity position topics
-        self.sheep_position_subscription = self.create_subscription(EntityPoseArray, 'sheep_simulation/sheep/pose', self.sheep_position_callback, 10)
-        self.wolf_position_subscription = self.create_subscription(EntityPoseArray, 'sheep_simulation/wolf/pose', self.wolf_position_callback, 10)
+        # clients to resolve entity ids in pose blocks to names
+        self.sheep_names_client = self.create_client(EntityNames, 'sheep_simulation/sheep/names')
+        self.wolf_names_client = self.create_client(EntityNames, 'sheep_simulation/wolf/names')
+        self.pending_name_requests = set()
 
-        # create grid
-        grid_size = 50.0
-        self.grid = self.create_grid(size=grid_size)
+        # sheep and wolf poses rebuilt from delta pose blocks
+        self.sheep_stream = PoseStream(FlockStore(registry=self.sheep_registry), keyframe_client=self.create_client(Trigger, 'sheep_simulation/sheep/keyframe'))
+        self.wolf_stream = PoseStream(FlockStore(capacity=4, registry=self.wolf_registry), keyframe_client=self.create_client(Trigger, 'sheep_simulation/wolf/keyframe'))
 
-        # create pens
-        self.pen_size = 10.0
-        pen_markers = []
-        self.pen_markers_msg = MarkerArray()
+        # ids updated since markers were last published
+        self.sheep_changed = []
+        self.wolf_changed = []
 
-        pen_markers.append(self.create_pen_marker("sheep_pen", size=self.pen_size))
-        pen_markers.append(self.create_pen_marker("wolf_pen1", size=self.pen_size / 2))
-        pen_markers.append(self.create_pen_marker("wolf_pen2", size=self.pen_size / 2))
+        # subcribe to entity position topics, only needed for the markers
+        self.viz_timer = None
+        if self.visualization:
+            self.sheep_position_subscription = self.create_subscription(PoseBlock, 'sheep_simulation/sheep/pose_block', self.sheep_position_callback, pose_qos)
+            self.wolf_position_subscription = self.create_subscription(PoseBlock, 'sheep_simulation/wolf/pose_block', self.wolf_position_callback, pose_qos)
+            if max_viz_rate > 0:
+                self.viz_timer = self.create_timer(1.0 / max_viz_rate, self.publish_visualization)
 
-        self.pen_markers_msg.markers = pen_markers
-        self.create_timer(0.5, self.update_markers)
-        #self.pen_marker_publisher.publish(pen_markers_msg)
+        # create grid
+        self.grid_size = 50.0
+        self.grid = self.create_grid(size=self.grid_size)
 
-        # spawn 6 sheep in 2 groups of 3
-        self.spawn_sheep_group("group1", center_x=-(grid_size/3), center_y=(grid_size/3))
-        self.spawn_sheep_group("group2", center_x=(grid_size/3), center_y=-(grid_size/3))
+        # create pens
+        self.pen_size = 10.0
+        self.publish_grid()
+        if self.visualization:
+            self.publish_pen_markers()
+
+        # Startup never blocks here: a timer spawns once the sheep and wolf nodes are ready.
+        # When composed in one process spawn_entities is called once the other nodes exist
+        self.startup_state = "waiting"
+        self.startup_timer = None
+        if spawn:
+            self.get_logger().info('Waiting for the sheep and wolf spawn services...')
+            self.startup_timer = self.create_timer(0.05, self.startup_step)
+
+    def startup_step(self):
+        # waiting -> spawning -> running. The sheep node only offers spawning once it has the grid
+        if self.startup_state != "waiting":
+            return
+
+        sheep_client = self.generate_flock_client if self.spawn_mode == "generate" else self.sheep_spawn_client
+        if not (sheep_client.service_is_ready() and self.wolf_spawn_client.service_is_ready()):
+            return
+
+        self.startup_timer.cancel()
+        self.get_logger().info(f"Sheep and wolf nodes ready after {time.monotonic() - self.startup_start:.2f} s")
+        self.spawn_entities().add_done_callback(self.startup_complete)
+
+    def startup_complete(self, future):
+        # The simulation runs with whatever did spawn, a failed spawn is only reported
+        if future.result():
+            self.startup_state = "running"
+            self.get_logger().info(f"Startup complete in {time.monotonic() - self.startup_start:.2f} s")
+        else:
+            self.startup_state = "failed"
+            self.get_logger().error(f"Startup finished with failed spawn requests in {time.monotonic() - self.startup_start:.2f} s")
+
+    def spawn_entities(self):
+        """Spawn the flock and the wolves without blocking.
+
+        Returns a Future that is done once both are, with True if every spawn request succeeded.
+        """
+        self.startup_state = "spawning"
+        futures = []
+
+        # spawn sheep_count sheep in 2 groups
+        futures.append(self.spawn_sheep())
 
         # spawn 2 wolves in respective pens
         wolf_spawns = [
             ["wolf1", self.grid[0][0]+self.pen_size/4, self.grid[1][1]-self.pen_size/4],
             ["wolf2", self.grid[0][0]+self.pen_size/4, self.grid[1][0]+self.pen_size/4]
         ]
-        self.spawn_wolf_group(wolf_spawns)
+        futures.append(self.spawn_wolf_group(wolf_spawns))
         # self.spawn_wolf("wolf1", x=self.grid[0][0]+self.pen_size/4, y=self.grid[1][1]-self.pen_size/4)
         # self.spawn_wolf("wolf2", x=self.grid[0][0]+self.pen_size/4, y=self.grid[1][0]+self.pen_size/4)
 
+        spawned = Future()
+
+        def spawn_done(future):
+            if all(f.done() for f in futures) and not spawned.done():
+                spawned.set_result(self.sheep_spawn_stats["failed"] == 0 and futures[1].result())
+
+        for future in futures:
+            future.add_done_callback(spawn_done)
+        return spawned
+
     def create_grid(self, size):
         grid = [
             [-(size/2), (size/2)], #xmin, xmax
@@ -75,38 +189,126 @@ class MasterSimulationNode(Node):
 
         return grid
 
-    def spawn_sheep_group(self, group_name, center_x, center_y):
-        spawn_array = []
-        for i in range(50):
+    def spawn_sheep(self):
+        """Spawn the flock without blocking, returns a Future that is done once every sheep is spawned.
+
+        Requests are queued and at most spawn_max_inflight are outstanding at
+        once, each reply sends the next one. Requests are only built when sent,
+        so a large flock never sits in memory as messages.
+        """
+        self.sheep_spawn_future = Future()
+        self.sheep_spawn_queue = collections.deque()
+        self.sheep_spawn_inflight = 0
+        self.sheep_spawn_sending = False
+        self.sheep_spawn_stats = {"spawned": 0, "requests": 0, "failed": 0, "start": time.monotonic()}
+
+        for group in range(2):
+            count = self.sheep_count // 2 + (self.sheep_count % 2 if group == 0 else 0)
+            prefix = f"group{group + 1}_sheep"
+            if self.spawn_mode == "generate":
+                # A single small request per group, the sheep node draws the poses itself
+                self.sheep_spawn_queue.append((self.generate_flock_client, self.make_generate_request(count, prefix, group), self.sheep_flock_generated))
+            else:
+                poses = FLOCK_LAYOUTS[self.flock_distribution](count, self.grid, self.rng)
+                for start in range(0, count, self.spawn_chunk_size):
+                    names = [f"{prefix}{i + 1}" for i in range(start, min(start + self.spawn_chunk_size, count))]
+                    chunk = poses[start:start + len(names)]
+                    self.sheep_spawn_queue.append((self.sheep_spawn_client, lambda names=names, chunk=chunk: self.make_spawn_request(names, chunk), self.sheep_chunk_spawned))
+
+        self.send_sheep_spawn_requests()
+        return self.sheep_spawn_future
+
+    def make_spawn_request(self, names, poses):
+        request = EntitySpawn.Request()
+        for name, (x, y, theta) in zip(names, poses.tolist()):
             entity = EntityPose()
-
-            entity.name = f"{group_name}_sheep{i+1}"
-            # entity.x = random.uniform(center_x - 2.0, center_x + 2.0)
-            # entity.y = random.uniform(center_y - 2.0, center_y + 2.0)
-            entity.x = random.uniform(self.grid[0][0], self.grid[0][1])
-            entity.y = random.uniform(self.grid[1][0], self.grid[1][1])
-
-            spawn_array.append(entity)
-            # self.spawn_sheep(name, x, y)
-            
-            # Create markers for visualization
-            marker = self.create_marker("sheep", entity.name)
-            marker.pose.position.x = entity.x
-            marker.pose.position.y = entity.y
-            marker.pose.position.z = 0.0
-            marker.pose.orientation.z = math.sin(entity.theta / 2)
-            marker.pose.orientation.w = math.cos(entity.theta / 2)
-
-            self.sheep_markers[entity.name] = marker
-        
-        self.sheep_spawn_request.spawn_entities = spawn_array
-
-        future = self.sheep_spawn_client.call_async(self.sheep_spawn_request)
-
-        rclpy.spin_until_future_complete(self, future)
+            entity.name = name
+            entity.x = x
+            entity.y = y
+            entity.theta = theta
+            request.spawn_entities.append(entity)
+        return request
+
+    def make_generate_request(self, count, prefix, stream):
+        def make_request():
+            request = GenerateFlock.Request()
+            request.count = count
+            request.seed = self.seed
+            request.stream = stream
+            request.distribution = self.flock_distribution
+            request.name_prefix = prefix
+            return request
+        return make_request
+
+    def send_sheep_spawn_requests(self):
+        # Replies that arrive while sending (in-process clients answer at once) must not recurse back in here
+        if self.sheep_spawn_sending:
+            return
+        self.sheep_spawn_sending = True
+        while self.sheep_spawn_queue and self.sheep_spawn_inflight < self.spawn_max_inflight:
+            client, make_request, on_done = self.sheep_spawn_queue.popleft()
+            request = make_request()
+            self.sheep_spawn_inflight += 1
+            self.sheep_spawn_stats["requests"] += 1
+            client.call_async(request).add_done_callback(lambda future, request=request, on_done=on_done: on_done(request, future))
+        self.sheep_spawn_sending = False
+
+        if self.sheep_spawn_inflight == 0 and not self.sheep_spawn_queue and not self.sheep_spawn_future.done():
+            stats = self.sheep_spawn_stats
+            self.get_logger().info(
+                f"Spawned {stats['spawned']} sheep in {stats['requests']} requests ({stats['failed']} failed), "
+                f"{time.monotonic() - stats['start']:.2f} s"
+            )
+            self.sheep_spawn_future.set_result(stats['spawned'])
+
+    def spawn_error(self, future):
+        """Why a finished spawn call failed, None if it got a response that says "ok"."""
+        if future.cancelled():
+            return "cancelled"
+        if future.exception() is not None:
+            return str(future.exception())
+        response = future.result()
+        if response is None:
+            return "no response"
+        if response.result != "ok":
+            return response.result
+        return None
+
+    def sheep_chunk_spawned(self, request, future):
+        error = self.spawn_error(future)
+        if error is not None:
+            # Counted as a failed chunk, so the spawn still finishes
+            self.sheep_spawn_progress(0, error)
+            return
+        # The sheep node hands back the handles it assigned, names and markers are only kept for per-entity markers
+        response = future.result()
+        if self.marker_mode == "entities":
+            names = [entity.name for entity in request.spawn_entities]
+            self.sheep_registry.assign(response.ids, names)
+            self.set_entity_markers(self.sheep_markers, response.ids, [self.create_marker("sheep", name) for name in names])
+        self.sheep_spawn_progress(len(response.ids), response.result)
+
+    def sheep_flock_generated(self, request, future):
+        # Handles first_id.. are resolved through the names service when markers need them
+        error = self.spawn_error(future)
+        if error is not None:
+            self.sheep_spawn_progress(0, error)
+            return
+        response = future.result()
+        self.sheep_spawn_progress(response.count, response.result)
+
+    def sheep_spawn_progress(self, count, result):
+        self.sheep_spawn_inflight -= 1
+        self.sheep_spawn_stats["spawned"] += count
+        if result != "ok":
+            self.sheep_spawn_stats["failed"] += 1
+            self.get_logger().error(f"Sheep spawn request failed: {result}")
+        self.send_sheep_spawn_requests()
 
     def spawn_wolf_group(self, wolves):
+        """Spawn the wolves without blocking, returns a Future that is done with True once they are, False if the request failed."""
         spawn_array = []
+        markers = []
         for wolf in wolves:
             entity = EntityPose()
 
@@ -124,118 +326,153 @@ class MasterSimulationNode(Node):
             marker.pose.orientation.z = math.sin(entity.theta / 2)
             marker.pose.orientation.w = math.cos(entity.theta / 2)
 
-            self.wolf_markers[entity.name] = marker
+            markers.append(marker)
         
-        self.wolf_spawn_request.spawn_entities = spawn_array
+        request = EntitySpawn.Request()
+        request.spawn_entities = spawn_array
+
+        spawned = Future()
+
+        def wolves_spawned(future):
+            error = self.spawn_error(future)
+            if error is not None:
+                self.get_logger().error(f"Wolf spawn request failed: {error}")
+                spawned.set_result(False)
+                return
+            handles = future.result().ids
+            self.wolf_registry.assign(handles, [entity.name for entity in spawn_array])
+            self.set_entity_markers(self.wolf_markers, handles, markers)
+            spawned.set_result(True)
 
-        future = self.wolf_spawn_client.call_async(self.wolf_spawn_request)
+        self.wolf_spawn_client.call_async(request).add_done_callback(wolves_spawned)
+        return spawned
 
-        rclpy.spin_until_future_complete(self, future)
+    def set_entity_markers(self, markers, handles, new_markers):
+        for handle, marker in zip(handles, new_markers):
+            if handle >= len(markers):
+                markers.extend([None] * (handle + 1 - len(markers)))
+            markers[handle] = marker
 
 
     def in_pen(self, x, y):
-        return (x >= self.grid[0][1] - self.pen_size) and (y >= self.grid[1][1] - self.pen_size)
+        return in_pen(self.grid, self.pen_size, x, y)
 
     def sheep_position_callback(self, response):
-        msg = MarkerArray()
-        markers = []
-        for sheep in response.entity_positions:
-            if self.sheep_markers[sheep.name]:
-                self.sheep_markers[sheep.name].pose.position.x = sheep.x
-                self.sheep_markers[sheep.name].pose.position.y = sheep.y
-                # self.sheep_marker_publisher.publish(self.sheep_markers[sheep.name])
-                markers.append(self.sheep_markers[sheep.name])
-
-        msg.markers = markers
-        self.sheep_marker_publisher.publish(msg)
+        with self.phases.time("sheep_pose_block"):
+            self.sheep_changed.append(self.sheep_stream.apply(response))
+        if self.viz_timer is None:
+            self.publish_visualization()
 
     def wolf_position_callback(self, response):
-        msg = MarkerArray()
-        markers = []
-        for wolf in response.entity_positions:
-            if self.wolf_markers[wolf.name]:
-                self.wolf_markers[wolf.name].pose.position.x = wolf.x
-                self.wolf_markers[wolf.name].pose.position.y = wolf.y
-                # self.sheep_marker_publisher.publish(self.sheep_markers[sheep.name])
-                markers.append(self.wolf_markers[wolf.name])
-
-        msg.markers = markers
-        self.wolf_marker_publisher.publish(msg)
-
-    def grid_init_callback(self, request, response):
-        response.xmin = self.grid[0][0]
-        response.xmax = self.grid[0][1]
-        response.ymin = self.grid[1][0]
-        response.ymax = self.grid[1][1]
-        response.pensize = self.pen_size
+        with self.phases.time("wolf_pose_block"):
+            self.wolf_changed.append(self.wolf_stream.apply(response))
+        if self.viz_timer is None:
+            self.publish_visualization()
+
+    def publish_visualization(self):
+        # Markers for the latest poses only, however many pose blocks arrived since the last call
+        if not self.sheep_changed and not self.wolf_changed:
+            return
+
+        with self.profiling.tick():
+            if self.sheep_changed:
+                with self.phases.time("sheep_markers"):
+                    ids = np.unique(np.concatenate(self.sheep_changed))
+                    self.sheep_changed = []
+                    self.publish_sheep_markers(ids)
+
+            if self.wolf_changed:
+                with self.phases.time("wolf_markers"):
+                    ids = np.unique(np.concatenate(self.wolf_changed))
+                    self.wolf_changed = []
+                    self.publish_wolf_markers(ids)
+
+    def publish_sheep_markers(self, ids):
+        if self.marker_mode == "entities":
+            self.update_entity_markers(ids, self.sheep_stream.store, "sheep", self.sheep_markers, self.sheep_names_client, self.sheep_marker_publisher)
+        else:
+            states = None
+            if self.marker_state_colors:
+                with self.phases.time("sheep_states"):
+                    states = self.sheep_states()
+            self.publish_population_marker("sheep", self.sheep_stream.store, self.sheep_marker_publisher, states)
+
+    def publish_wolf_markers(self, ids):
+        if self.marker_mode == "entities":
+            self.update_entity_markers(ids, self.wolf_stream.store, "wolf", self.wolf_markers, self.wolf_names_client, self.wolf_marker_publisher)
+        else:
+            self.publish_population_marker("wolf", self.wolf_stream.store, self.wolf_marker_publisher)
+
+    def sheep_states(self):
+        sheep, wolves = self.sheep_stream.store, self.wolf_stream.store
+        return sheep_states(self.grid, self.pen_size, sheep.x, sheep.y, wolves.x, wolves.y)
+
+    def publish_population_marker(self, entity_type, poses, publisher, states=None):
+        with self.phases.time("marker_build"):
+            marker = self.population_markers.get(entity_type)
+            if marker is None:
+                marker = self.population_markers[entity_type] = PopulationMarker(entity_type, self.marker_mode)
+            msg = marker.update(poses.x, poses.y, states)
+        with self.phases.time("marker_publish"):
+            publisher.publish(msg)
+
+    def update_entity_markers(self, ids, poses, entity_type, markers, names_client, publisher):
+        # Only the entities in ids changed, the other markers stay where they are
+        x, y = poses.x[ids], poses.y[ids]
+
+        # Handles are only resolved once, entities without a name yet are skipped until the reply arrives
+        unknown = [i for i in ids.tolist() if i >= len(markers) or markers[i] is None]
+        if unknown:
+            self.request_entity_names(names_client, unknown, entity_type, poses.registry, markers)
 
-        return response
+        msg = MarkerArray()
+        updated = []
+        for i, px, py in zip(ids.tolist(), x.tolist(), y.tolist()):
+            marker = markers[i] if i < len(markers) else None
+            if marker is not None:
+                marker.pose.position.x = px
+                marker.pose.position.y = py
+                updated.append(marker)
+
+        msg.markers = updated
+        with self.phases.time("marker_publish"):
+            publisher.publish(msg)
+
+    def request_entity_names(self, names_client, ids, entity_type, registry, markers):
+        if names_client in self.pending_name_requests:
+            return
+        self.pending_name_requests.add(names_client)
+
+        request = EntityNames.Request()
+        request.ids = ids
+
+        def names_callback(future):
+            self.pending_name_requests.discard(names_client)
+            response = future.result()
+            registry.assign(response.ids, response.names)
+            self.set_entity_markers(markers, response.ids, [self.create_marker(entity_type, name) for name in response.names])
+
+        names_client.call_async(request).add_done_callback(names_callback)
+
+    def publish_grid(self):
+        # Latched, call again whenever the grid changes
+        msg = Grid()
+        msg.xmin = self.grid[0][0]
+        msg.xmax = self.grid[0][1]
+        msg.ymin = self.grid[1][0]
+        msg.ymax = self.grid[1][1]
+        msg.pensize = self.pen_size
+        self.grid_publisher.publish(msg)
 
     def create_marker(self, entity_type, name):
-        marker = Marker()
-        marker.header.frame_id = "map"
-        marker.ns = name
-        marker.id = 0
-        marker.type = Marker.SPHERE
-        marker.action = Marker.ADD
-        marker.scale.x = 0.5
-        marker.scale.y = 0.5
-        marker.scale.z = 0.5
-        marker.color.a = 1.0
-
-        if entity_type == "sheep":  # Green for sheep
-            marker.color.r = 0.0
-            marker.color.g = 1.0
-            marker.color.b = 0.0
-        elif entity_type == "wolf":  # Red for wolf
-            marker.color.r = 1.0
-            marker.color.g = 0.0
-            marker.color.b = 0.0
-
-        return marker
+        return create_marker(entity_type, name)
 
     def create_pen_marker(self, name, size=10.0):
-        marker = Marker()
-        marker.header.frame_id = "map"
-        marker.ns = name
-        marker.id = 0
-        marker.type = Marker.CUBE
-        marker.action = Marker.ADD
-        marker.scale.x = size
-        marker.scale.y = size
-        marker.scale.z = 0.1
-
-        if name == "sheep_pen":
-            marker.pose.position.x = self.grid[0][1] - (size/2)
-            marker.pose.position.y = self.grid[1][1] - (size/2)
-            marker.pose.position.z = 0.0
-            marker.color.a = 0.5
-            marker.color.r = 0.0
-            marker.color.g = 0.0
-            marker.color.b = 1.0
-
-        elif name == "wolf_pen1":
-            marker.pose.position.x = self.grid[0][0] + (size/2)
-            marker.pose.position.y = self.grid[1][1] - (size/2)
-            marker.pose.position.z = 0.0
-            marker.color.a = 0.5
-            marker.color.r = 0.5
-            marker.color.g = 0.0
-            marker.color.b = 0.0
-
-        elif name == "wolf_pen2":
-            marker.pose.position.x = self.grid[0][0] + (size/2)
-            marker.pose.position.y = self.grid[0][0] + (size/2)
-            marker.pose.position.z = 0.0
-            marker.color.a = 0.5
-            marker.color.r = 0.5
-            marker.color.g = 0.0
-            marker.color.b = 0.0
-
-        return marker
+        return create_pen_marker(self.grid, name, size)
 
-    def update_markers(self):
-        self.pen_marker_publisher.publish(self.pen_markers_msg)
+    def publish_pen_markers(self):
+        # Pens only depend on the grid, call again whenever it changes
+        self.pen_marker_publisher.publish(pen_markers(self.grid, self.pen_size))
 
 def main(args=None):
     rclpy.init(args=args)
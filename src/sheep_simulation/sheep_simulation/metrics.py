@@ -0,0 +1,104 @@
+import math
+
+import numpy as np
+
+
+class HerdingMetricsTracker():
+    """Herding KPIs kept up to date every tick.
+
+    update() costs a few vectorised passes over the flock into scratch
+    arrays that are reused between ticks, plus O(W) for the wolves. The pen
+    count and time to pen come from the flock's PenOccupancy in O(1).
+    """
+
+    def __init__(self, arena, capacity=64):
+        self.arena = arena
+
+        self.tick = 0
+        self.penned = 0
+        self.total = 0
+        self.time_to_pen = None  # Tick the flock was first fully penned, None until then
+        self.dispersion = 0.0  # Mean distance of the sheep from the flock centre
+        self.max_pen_distance = 0.0  # Largest distance of a sheep outside the pen to the pen
+        self.wolf_path_lengths = np.zeros(0)  # Distance walked by each wolf, indexed by wolf id
+
+        self._dx = np.zeros(capacity)
+        self._dy = np.zeros(capacity)
+        self._last_wolf_x = np.zeros(0)
+        self._last_wolf_y = np.zeros(0)
+
+    @property
+    def wolf_path_length(self):
+        return float(self.wolf_path_lengths.sum())
+
+    def reserve(self, capacity):
+        if capacity > len(self._dx):
+            capacity = max(capacity, 2 * len(self._dx))
+            self._dx = np.zeros(capacity)
+            self._dy = np.zeros(capacity)
+
+    def update(self, sheep, wolves, pen_occupancy):
+        """Advance one tick from the sheep and wolf FlockStores and the flock's PenOccupancy."""
+        self.tick = pen_occupancy.tick
+        self.penned = pen_occupancy.penned
+        self.total = pen_occupancy.total
+        if self.time_to_pen is None and pen_occupancy.full_pen_tick is not None:
+            self.time_to_pen = pen_occupancy.full_pen_tick
+
+        self.update_sheep(sheep, pen_occupancy.all_penned)
+        self.update_wolves(wolves)
+
+    def update_sheep(self, sheep, all_penned):
+        count = len(sheep)
+        if count == 0:
+            self.dispersion = 0.0
+            self.max_pen_distance = 0.0
+            return
+
+        self.reserve(count)
+        dx, dy = self._dx[:count], self._dy[:count]
+
+        np.subtract(sheep.x, sheep.x.mean(), out=dx)
+        np.subtract(sheep.y, sheep.y.mean(), out=dy)
+        np.hypot(dx, dy, out=dx)
+        self.dispersion = float(dx.mean())
+
+        # Distance to the pen rectangle, it sits in the top right corner so only the min edges count
+        if all_penned:
+            self.max_pen_distance = 0.0
+            return
+        np.subtract(self.arena.pen_x_min, sheep.x, out=dx)
+        np.maximum(dx, 0.0, out=dx)
+        np.subtract(self.arena.pen_y_min, sheep.y, out=dy)
+        np.maximum(dy, 0.0, out=dy)
+        np.multiply(dx, dx, out=dx)
+        np.multiply(dy, dy, out=dy)
+        np.add(dx, dy, out=dx)
+        self.max_pen_distance = math.sqrt(dx.max())
+
+    def add_wolves(self, wolves):
+        """Start the path of wolves spawned since the last call from where they are now."""
+        known = len(self.wolf_path_lengths)
+        if len(wolves) > known:
+            self.wolf_path_lengths = np.concatenate([self.wolf_path_lengths, np.zeros(len(wolves) - known)])
+            self._last_wolf_x = np.concatenate([self._last_wolf_x, wolves.x[known:]])
+            self._last_wolf_y = np.concatenate([self._last_wolf_y, wolves.y[known:]])
+
+    def update_wolves(self, wolves):
+        # Wolves the tracker was not told about start counting from their first update
+        self.add_wolves(wolves)
+        self.wolf_path_lengths += np.hypot(wolves.x - self._last_wolf_x, wolves.y - self._last_wolf_y)
+        self._last_wolf_x[:] = wolves.x
+        self._last_wolf_y[:] = wolves.y
+
+    def as_dict(self):
+        return {
+            "tick": self.tick,
+            "penned": self.penned,
+            "total": self.total,
+            "time_to_pen": self.time_to_pen,
+            "dispersion": self.dispersion,
+            "max_pen_distance": self.max_pen_distance,
+            "wolf_path_length": self.wolf_path_length,
+            "wolf_path_lengths": self.wolf_path_lengths.tolist()
+        }
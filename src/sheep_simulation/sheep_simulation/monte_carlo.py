@@ -0,0 +1,122 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sheep_simulation.episode_archive import EpisodeArchiveWriter, EpisodeWriter
+from sheep_simulation.simulation_engine import SimulationEngine
+
+
+RESULT_FIELDS = [
+    "episode", "seed", "sheep", "wolves", "grid_size", "ticks", "penned",
+    "ticks_to_pen", "final_dispersion", "max_pen_distance", "wolf_path_length", "wall_time"
+]
+
+
+def run_episode(episode, seed, sheep_count, wolf_count, grid_size, max_ticks, neighbor_backend="grid", archive=None, chunk_ticks=256):
+    """Run one seeded headless episode and summarise it.
+
+    With an archive directory the poses are written there as well, and the
+    result carries what EpisodeArchiveWriter.add needs under "archive".
+    """
+    start = time.perf_counter()
+
+    engine = SimulationEngine(grid_size=grid_size, neighbor_backend=neighbor_backend, seed=seed)
+    engine.spawn_default(sheep_count=sheep_count, wolf_count=wolf_count)
+    writer = None
+    if archive is not None:
+        writer = EpisodeWriter(archive, episode, engine.sheep.sheep, engine.wolves.wolves, chunk_ticks=chunk_ticks)
+        engine.recorders.append(writer)
+    ticks = engine.run(max_ticks=max_ticks)
+
+    result = {
+        "episode": episode,
+        "seed": seed,
+        "sheep": sheep_count,
+        "wolves": wolf_count,
+        "grid_size": grid_size,
+        "ticks": ticks,
+        "penned": engine.all_penned,
+        "ticks_to_pen": engine.sheep.pen_occupancy.full_pen_tick,
+        "final_dispersion": engine.metrics.dispersion,
+        "max_pen_distance": engine.metrics.max_pen_distance,
+        "wolf_path_length": engine.metrics.wolf_path_length,
+        "wall_time": time.perf_counter() - start,
+    }
+    if writer is not None:
+        result["archive"] = writer.close()
+    return result
+
+
+class ResultWriter():
+    """Appends one result per line as CSV or JSON lines, picked from the file extension."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.csv = None
+        if path.endswith(".csv"):
+            self.csv = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, result):
+        if self.csv is not None:
+            self.csv.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + "\n")
+        # Results are visible as soon as an episode finishes
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run a batch of seeded headless herding episodes in parallel")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--sheep", type=int, default=100, help="flock size")
+    parser.add_argument("--wolves", type=int, default=2, help="wolf count")
+    parser.add_argument("--grid-size", type=float, default=50.0, help="side length of the square grid")
+    parser.add_argument("--max-ticks", type=int, default=5000, help="give up on an episode after this many ticks")
+    parser.add_argument("--seed", type=int, default=0, help="episode i runs with seed + i")
+    parser.add_argument("--neighbor-backend", default="grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--output", default="episodes.jsonl", help="results file, .csv for CSV, anything else for JSON lines")
+    parser.add_argument("--archive", help="also archive every episode's poses into this directory, see episode_archive.py")
+    parser.add_argument("--chunk-ticks", type=int, default=256, help="ticks per archive chunk")
+    args = parser.parse_args(args)
+
+    writer = ResultWriter(args.output)
+    archive = EpisodeArchiveWriter(args.archive) if args.archive else None
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(
+                    run_episode, episode, args.seed + episode, args.sheep, args.wolves,
+                    args.grid_size, args.max_ticks, args.neighbor_backend, args.archive, args.chunk_ticks
+                )
+                for episode in range(args.episodes)
+            ]
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                archived = result.pop("archive", None)
+                writer.write(result)
+                if archive is not None:
+                    archive.add(result, archived)
+                print(
+                    f"[{done}/{args.episodes}] episode {result['episode']}: "
+                    f"ticks to pen {result['ticks_to_pen']}, {result['wall_time']:.2f} s"
+                )
+    finally:
+        writer.close()
+        if archive is not None:
+            archive.close()
+
+    print(f"{args.episodes} episodes in {time.perf_counter() - start:.1f} s, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import time
+
+import numpy as np
+
+from sheep_simulation.PsuedoSheepSeperationPort import PsuedoSheep
+from sheep_simulation.constants import WOLF_FLEE_DIST
+from sheep_simulation.flock_layout import FLOCK_LAYOUTS
+from sheep_simulation.neighbor_index import NEIGHBOR_INDEX_BACKENDS, make_neighbor_index
+
+
+# Interaction radii used by the sheep node
+COHESSION_DIST = PsuedoSheep.COHESSION_DIST
+
+
+def time_backend(backend, flock, wolves, repeats):
+    """Best wall time of one sheep tick worth of neighbour work (build, boids pairs, wolf query)."""
+    index = make_neighbor_index(backend, cell_size=max(COHESSION_DIST, WOLF_FLEE_DIST))
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        index.build(flock)
+        PsuedoSheep.step_flock(flock, index.query_pairs(COHESSION_DIST))
+        for _ in index.query(wolves, WOLF_FLEE_DIST):
+            pass
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare neighbour index backends on one flock layout")
+    parser.add_argument("--sheep", type=int, default=5000, help="flock size")
+    parser.add_argument("--wolves", type=int, default=2, help="number of wolves")
+    parser.add_argument("--layout", choices=sorted(FLOCK_LAYOUTS), default="uniform", help="flock distribution")
+    parser.add_argument("--grid-size", type=float, default=50.0, help="side length of the square grid")
+    parser.add_argument("--repeats", type=int, default=5, help="timed repeats per backend, best is reported")
+    parser.add_argument("--backends", nargs="+", choices=NEIGHBOR_INDEX_BACKENDS, default=NEIGHBOR_INDEX_BACKENDS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(args)
+
+    rng = np.random.default_rng(args.seed)
+    grid = [[-args.grid_size / 2, args.grid_size / 2], [-args.grid_size / 2, args.grid_size / 2]]
+    flock = FLOCK_LAYOUTS[args.layout](args.sheep, grid, rng)
+    wolves = FLOCK_LAYOUTS["uniform"](args.wolves, grid, rng)
+
+    results = {backend: time_backend(backend, flock, wolves, args.repeats) for backend in args.backends}
+
+    print(f"{args.sheep} sheep, {args.layout} layout, {args.grid_size} grid")
+    for backend, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(f"  {backend:<12} {seconds * 1000:10.2f} ms")
+    print(f"winner: {min(results, key=results.get)}")
+
+
+if __name__ == "__main__":
+    main()
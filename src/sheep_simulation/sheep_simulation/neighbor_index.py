@@ -0,0 +1,180 @@
+import numpy as np
+
+
+# Cell offsets covering a cell and its 8 neighbours
+CELL_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+class NeighborIndex():
+    """Radius queries over a set of 2D points, rebuilt once per tick.
+
+    Queries yield (query index, point index, squared distance) chunks so that
+    callers can accumulate results without holding every pair in memory.
+    """
+
+    def __init__(self, max_pairs=4_000_000):
+        # Upper bound on candidate pairs handled at once, keeps memory flat for dense flocks
+        self.max_pairs = max_pairs
+        self.build(np.empty((0, 2)))
+
+    def build(self, points):
+        self.points = np.asarray(points, dtype=float)[:, :2]
+
+    def query(self, queries, radius):
+        """Yield (query index, point index, squared distance) chunks for every point within radius."""
+        raise NotImplementedError
+
+    def query_pairs(self, radius):
+        """Yield (i, j, squared distance) chunks for every pair of indexed points within radius.
+
+        Zero distance pairs (including each point with itself) are left out,
+        same as PsuedoSheep.generate_neighbours.
+        """
+        for i, j, squared_distances in self.query(self.points, radius):
+            nonzero = squared_distances > 0
+            yield i[nonzero], j[nonzero], squared_distances[nonzero]
+
+
+class BruteForceIndex(NeighborIndex):
+    """Distance from every query to every point, in row blocks."""
+
+    def query(self, queries, radius):
+        queries = np.asarray(queries, dtype=float)[:, :2]
+        if len(queries) == 0 or len(self.points) == 0:
+            return
+
+        block_size = max(1, self.max_pairs // len(self.points))
+        for start in range(0, len(queries), block_size):
+            block = queries[start:start + block_size]
+            differences = self.points[None, :, :] - block[:, None, :]
+            squared_distances = (differences[:, :, 0] ** 2) + (differences[:, :, 1] ** 2)
+
+            q, p = np.nonzero(squared_distances <= radius ** 2)
+            yield q + start, p, squared_distances[q, p]
+
+
+class GridIndex(NeighborIndex):
+    """Uniform grid (spatial hash) with cells of cell_size.
+
+    Any radius up to cell_size only needs the 3x3 block of cells around a
+    query point, so a query costs the number of points in those cells rather
+    than the size of the whole flock.
+    """
+
+    def __init__(self, cell_size, max_pairs=4_000_000):
+        self.cell_size = float(cell_size)
+        super().__init__(max_pairs=max_pairs)
+
+    def build(self, points):
+        super().build(points)
+
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        if len(cells) > 0:
+            self.origin = cells.min(axis=0)
+            cells -= self.origin
+            self.shape = cells.max(axis=0) + 1
+        else:
+            self.origin = np.zeros(2, dtype=np.int64)
+            self.shape = np.zeros(2, dtype=np.int64)
+
+        # Sort points by cell key so each cell is one contiguous range
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def cell_ranges(self, queries):
+        """Start and length of the sorted point range for the 9 cells around each query."""
+        cells = np.floor(queries / self.cell_size).astype(np.int64) - self.origin
+
+        starts = np.zeros((len(queries), len(CELL_OFFSETS)), dtype=np.intp)
+        counts = np.zeros((len(queries), len(CELL_OFFSETS)), dtype=np.intp)
+        for k, (dx, dy) in enumerate(CELL_OFFSETS):
+            cx = cells[:, 0] + dx
+            cy = cells[:, 1] + dy
+            valid = (cx >= 0) & (cx < self.shape[0]) & (cy >= 0) & (cy < self.shape[1])
+            keys = cx * self.shape[1] + cy
+
+            starts[:, k] = np.searchsorted(self.sorted_keys, keys, side="left")
+            ends = np.searchsorted(self.sorted_keys, keys, side="right")
+            counts[:, k] = np.where(valid, ends - starts[:, k], 0)
+
+        return starts, counts
+
+    def query(self, queries, radius):
+        if radius > self.cell_size:
+            raise ValueError(f"query radius {radius} is larger than the cell size {self.cell_size}")
+
+        queries = np.asarray(queries, dtype=float)[:, :2]
+        if len(queries) == 0 or len(self.points) == 0:
+            return
+
+        starts, counts = self.cell_ranges(queries)
+        candidates = np.cumsum(counts.sum(axis=1))
+
+        first = 0
+        while first < len(queries):
+            # Take as many queries as fit in max_pairs candidates (at least one)
+            limit = (candidates[first - 1] if first > 0 else 0) + self.max_pairs
+            last = max(first + 1, int(np.searchsorted(candidates, limit, side="right")))
+
+            block_starts = starts[first:last].ravel()
+            block_counts = counts[first:last].ravel()
+            total = int(block_counts.sum())
+
+            # Expand each cell range into one candidate pair per point
+            q = np.repeat(np.repeat(np.arange(first, last), len(CELL_OFFSETS)), block_counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(block_counts) - block_counts, block_counts)
+            p = self.order[np.repeat(block_starts, block_counts) + offsets]
+
+            differences = self.points[p] - queries[q]
+            squared_distances = (differences[:, 0] ** 2) + (differences[:, 1] ** 2)
+            within = squared_distances <= radius ** 2
+            yield q[within], p[within], squared_distances[within]
+
+            first = last
+
+
+class KDTreeIndex(NeighborIndex):
+    """scipy cKDTree, copes best with tightly clustered flocks."""
+
+    def __init__(self, max_pairs=4_000_000, query_block=16384):
+        # scipy is only needed when this backend is selected
+        from scipy.spatial import cKDTree
+        self.cKDTree = cKDTree
+        self.query_block = query_block
+        super().__init__(max_pairs=max_pairs)
+
+    def build(self, points):
+        super().build(points)
+        self.tree = self.cKDTree(self.points)
+
+    def query(self, queries, radius):
+        queries = np.asarray(queries, dtype=float)[:, :2]
+        if len(queries) == 0 or len(self.points) == 0:
+            return
+
+        for start in range(0, len(queries), self.query_block):
+            block = queries[start:start + self.query_block]
+            pairs = self.cKDTree(block).sparse_distance_matrix(self.tree, radius, output_type="ndarray")
+
+            # Recompute squared distances the same way as the other backends so results agree exactly
+            q, p = pairs["i"].astype(np.intp), pairs["j"].astype(np.intp)
+            differences = self.points[p] - block[q]
+            squared_distances = (differences[:, 0] ** 2) + (differences[:, 1] ** 2)
+            within = squared_distances <= radius ** 2
+            yield q[within] + start, p[within], squared_distances[within]
+
+
+NEIGHBOR_INDEX_BACKENDS = ["brute_force", "grid", "kdtree"]
+
+
+def make_neighbor_index(backend, cell_size):
+    """Create the neighbour index named by backend, cell_size is the largest query radius."""
+    if backend == "brute_force":
+        return BruteForceIndex()
+    elif backend == "grid":
+        return GridIndex(cell_size=cell_size)
+    elif backend == "kdtree":
+        return KDTreeIndex()
+
+    raise ValueError(f"unknown neighbour index backend '{backend}', expected one of {NEIGHBOR_INDEX_BACKENDS}")
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class PenOccupancy():
+    """Running count of the sheep inside the pen.
+
+    Only the sheep that moved in a tick are re-checked, so the count, the
+    per-sheep mask and the tick the flock became fully penned can all be read
+    in O(1) instead of scanning the whole flock.
+    """
+
+    def __init__(self, pen_x_min, pen_y_min, capacity=64):
+        self.pen_x_min = pen_x_min
+        self.pen_y_min = pen_y_min
+
+        self._mask = np.zeros(capacity, dtype=bool)
+        self.total = 0
+        self.penned = 0
+
+        self.tick = 0
+        self.full_pen_tick = None  # Tick the flock last became fully penned, None while it isn't
+
+    @property
+    def mask(self):
+        return self._mask[:self.total]
+
+    @property
+    def all_penned(self):
+        return self.penned == self.total
+
+    def in_pen(self, x, y):
+        return (x >= self.pen_x_min) & (y >= self.pen_y_min)
+
+    def track_new(self, x, y):
+        """Start tracking sheep beyond the last known total, i.e. ones spawned since the last check."""
+        count = len(x)
+        if count <= self.total:
+            return
+
+        if count > len(self._mask):
+            grown = np.zeros(max(count, 2 * len(self._mask)), dtype=bool)
+            grown[:self.total] = self._mask[:self.total]
+            self._mask = grown
+
+        new = np.arange(self.total, count)
+        self._mask[new] = self.in_pen(x[new], y[new])
+        self.penned += int(np.count_nonzero(self._mask[new]))
+        self.total = count
+
+    def update(self, x, y, moved=None):
+        """Advance one tick, re-checking the sheep selected by moved (all of them if None)."""
+        self.tick += 1
+        self.track_new(x, y)
+
+        if moved is None:
+            moved = np.arange(self.total)
+        elif moved.dtype == bool:
+            moved = np.flatnonzero(moved)
+
+        was_penned = self._mask[moved]
+        now_penned = self.in_pen(x[moved], y[moved])
+        self.penned += int(np.count_nonzero(now_penned)) - int(np.count_nonzero(was_penned))
+        self._mask[moved] = now_penned
+
+        if not self.all_penned:
+            self.full_pen_tick = None
+        elif self.full_pen_tick is None:
+            self.full_pen_tick = self.tick
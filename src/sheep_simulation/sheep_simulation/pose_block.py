@@ -0,0 +1,75 @@
+import array
+
+import numpy as np
+
+from sheep_simulation_interfaces.msg import PoseBlock
+
+
+# Entity ids are the entity's index in the publisher's FlockStore. Entities are
+# never removed, so an id keeps meaning the same entity for the whole run and
+# the name only has to be looked up once through the EntityNames service.
+
+
+def make_pose_block(store, seq, stamp=None, frame_id="map", ids=None):
+    """PoseBlock holding the entities in ids, or a keyframe of every entity in store if ids is None.
+
+    The arrays are handed to the message as array.array buffers, so building
+    it costs a few memcpys rather than a Python object per entity.
+    """
+    msg = PoseBlock()
+    if stamp is not None:
+        msg.header.stamp = stamp
+    msg.header.frame_id = frame_id
+    msg.seq = seq
+    msg.keyframe = ids is None
+    msg.count = store.count
+
+    if ids is None:
+        msg.ids = array.array("I", np.arange(store.count, dtype=np.uint32).tobytes())
+        msg.x = array.array("f", store.x.tobytes())
+        msg.y = array.array("f", store.y.tobytes())
+        msg.theta = array.array("f", store.theta.tobytes())
+    else:
+        msg.ids = array.array("I", np.asarray(ids, dtype=np.uint32).tobytes())
+        msg.x = array.array("f", store.x[ids].tobytes())
+        msg.y = array.array("f", store.y[ids].tobytes())
+        msg.theta = array.array("f", store.theta[ids].tobytes())
+    return msg
+
+
+def field_array(field, dtype):
+    """NumPy view over a numeric array field of a message.
+
+    rclpy hands array fields over as array.array, which exposes its buffer,
+    so np.frombuffer can wrap it without copying or touching the elements
+    from Python. Anything else, e.g. a plain list, is converted instead.
+    """
+    try:
+        return np.frombuffer(field, dtype=dtype)
+    except TypeError:
+        return np.asarray(field, dtype=dtype)
+
+
+def read_pose_block(msg):
+    """(ids, x, y, theta) arrays of a PoseBlock, views over the message's buffers."""
+    return (
+        field_array(msg.ids, np.uint32),
+        field_array(msg.x, np.float32),
+        field_array(msg.y, np.float32),
+        field_array(msg.theta, np.float32)
+    )
+
+
+def apply_pose_block(store, msg):
+    """Write the poses in a PoseBlock into store, indexed by entity id."""
+    ids, x, y, theta = read_pose_block(msg)
+    store.assign(ids, x, y, theta)
+    return ids
+
+
+def fill_entity_names(store, request, response):
+    """EntityNames service body, resolves the requested ids (all of them if none are given)."""
+    ids = [i for i in request.ids if i < store.count] if len(request.ids) > 0 else range(store.count)
+    response.ids = [int(i) for i in ids]
+    response.names = [store.names[i] for i in ids]
+    return response
@@ -0,0 +1,104 @@
+import numpy as np
+
+from std_srvs.srv import Trigger
+
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.pose_block import make_pose_block, read_pose_block
+
+
+class PoseDeltaEncoder():
+    """Turns a FlockStore into a stream of delta and keyframe PoseBlocks.
+
+    A delta only carries the entities that moved more than epsilon since they
+    were last sent, or turned more than epsilon radians, so a receiver is
+    never more than epsilon off in position or heading. A keyframe
+    with every entity goes out every keyframe_interval ticks, or on the next
+    tick after request_keyframe(). A keyframe_interval of 1 sends keyframes only.
+    """
+
+    def __init__(self, epsilon=0.01, keyframe_interval=10):
+        self.epsilon = epsilon
+        self.keyframe_interval = max(1, keyframe_interval)
+
+        self.seq = 0
+        self.since_keyframe = None  # None until the first keyframe
+        self.sent_x = np.zeros(0, dtype=np.float32)
+        self.sent_y = np.zeros(0, dtype=np.float32)
+        self.sent_theta = np.zeros(0, dtype=np.float32)
+
+    def request_keyframe(self):
+        self.since_keyframe = None
+
+    def encode(self, store, stamp=None, frame_id="map"):
+        self.seq += 1
+
+        if self.since_keyframe is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            self.since_keyframe = 0
+            self.sent_x = store.x.copy()
+            self.sent_y = store.y.copy()
+            self.sent_theta = store.theta.copy()
+            return make_pose_block(store, self.seq, stamp, frame_id)
+
+        self.since_keyframe += 1
+
+        # Entities spawned since the last block have never been sent
+        known = len(self.sent_x)
+        if store.count > known:
+            self.sent_x = np.concatenate([self.sent_x, np.full(store.count - known, np.inf, dtype=np.float32)])
+            self.sent_y = np.concatenate([self.sent_y, np.full(store.count - known, np.inf, dtype=np.float32)])
+            self.sent_theta = np.concatenate([self.sent_theta, store.theta[known:store.count]])
+
+        dx = store.x - self.sent_x
+        dy = store.y - self.sent_y
+        # Heading difference wrapped to [-pi, pi), a full turn is no change
+        dtheta = np.remainder(store.theta - self.sent_theta + np.pi, 2 * np.pi) - np.pi
+        ids = np.flatnonzero((dx * dx + dy * dy > self.epsilon * self.epsilon) | (np.abs(dtheta) > self.epsilon))
+
+        self.sent_x[ids] = store.x[ids]
+        self.sent_y[ids] = store.y[ids]
+        self.sent_theta[ids] = store.theta[ids]
+        return make_pose_block(store, self.seq, stamp, frame_id, ids=ids)
+
+
+class PoseStream():
+    """Rebuilds the publisher's poses from a stream of delta and keyframe PoseBlocks.
+
+    Blocks are written into a FlockStore by entity id. Until the first
+    keyframe, or after a gap in the sequence numbers, some poses may be stale.
+    In that case a keyframe is requested through keyframe_client if one is
+    given, otherwise the stream catches up at the next periodic keyframe.
+    """
+
+    def __init__(self, store=None, keyframe_client=None):
+        self.store = FlockStore() if store is None else store
+        self.keyframe_client = keyframe_client
+        self.keyframe_pending = False
+
+        self.synced = False  # Whether the poses match the publisher, as of the last keyframe with no gaps since
+        self.seq = None
+        self.missed = 0  # Blocks lost to sequence gaps
+
+    def apply(self, msg):
+        """Apply one PoseBlock, returns the ids it updated."""
+        if self.seq is not None and msg.seq > self.seq + 1:
+            self.missed += msg.seq - self.seq - 1
+            self.synced = False
+        self.seq = msg.seq
+
+        ids, x, y, theta = read_pose_block(msg)
+        self.store.assign(ids, x, y, theta)
+
+        if msg.keyframe:
+            self.synced = True
+            self.keyframe_pending = False
+        elif not self.synced:
+            self.request_keyframe()
+
+        return ids
+
+    def request_keyframe(self):
+        if self.keyframe_client is None or self.keyframe_pending or not self.keyframe_client.service_is_ready():
+            return
+
+        self.keyframe_pending = True
+        self.keyframe_client.call_async(Trigger.Request())
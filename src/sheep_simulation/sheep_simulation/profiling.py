@@ -0,0 +1,132 @@
+import contextlib
+import cProfile
+import os
+import pstats
+import time
+
+import numpy as np
+
+
+# Per-tick profiling, no ROS needed: every phase of a tick is timed into a
+# rolling window of samples, and cProfile can be run over the next N ticks.
+# diagnostics.py publishes both from the simulation nodes.
+
+PERCENTILES = (50, 95, 99)
+
+
+class PhaseTiming():
+    """Context manager timing one phase, reused for every tick so entering it allocates nothing."""
+
+    __slots__ = ("timer", "phase", "start")
+
+    def __init__(self, timer, phase):
+        self.timer = timer
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.add(self.phase, time.perf_counter() - self.start)
+
+
+class PhaseTimer():
+    """Durations of the last window samples of each phase, in seconds.
+
+    Phases are listed in the order they were first timed.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+        self.timings = {}
+
+    def time(self, phase):
+        timing = self.timings.get(phase)
+        if timing is None:
+            timing = self.timings[phase] = PhaseTiming(self, phase)
+            self.samples[phase] = np.zeros(self.window)
+            self.counts[phase] = 0
+        return timing
+
+    def add(self, phase, seconds):
+        count = self.counts[phase]
+        self.samples[phase][count % self.window] = seconds
+        self.counts[phase] = count + 1
+
+    def percentiles(self, phase):
+        """p50, p95 and p99 of a phase over the window, None before it was first timed."""
+        count = min(self.counts.get(phase, 0), self.window)
+        if count == 0:
+            return None
+        return np.percentile(self.samples[phase][:count], PERCENTILES)
+
+
+class NullPhaseTimer():
+    """Stands in for a PhaseTimer where nothing is measured, e.g. the headless engine."""
+
+    timing = contextlib.nullcontext()
+
+    def time(self, phase):
+        return self.timing
+
+
+NULL_PHASES = NullPhaseTimer()
+
+
+class TickProfiler():
+    """cProfile over a number of ticks, written as a .prof file and a pstats text summary next to it.
+
+    cProfile allows one profile per process at a time, so with the nodes
+    composed into one process only one of their profilers can be active.
+    """
+
+    running = None  # The active profiler of this process
+
+    def __init__(self):
+        self.profile = None
+        self.remaining = 0
+        self.path = None
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def start(self, ticks, path):
+        # Everything the thread runs until the last tick ends is profiled, callbacks in between included
+        if TickProfiler.running is not None:
+            raise ValueError(f"another profile of this process is running, writing to {TickProfiler.running.path}")
+        profile = cProfile.Profile()
+        profile.enable()
+        self.profile = profile
+        self.remaining = ticks
+        self.path = path
+        TickProfiler.running = self
+
+    def tick_done(self):
+        """Count a finished tick. Returns the path written to once the last one is done, None otherwise.
+
+        Raises OSError when the profile can't be written, the profiler is stopped either way.
+        """
+        if self.profile is None:
+            return None
+        self.remaining -= 1
+        if self.remaining > 0:
+            return None
+
+        path = self.path
+        try:
+            self.profile.disable()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.profile.dump_stats(path)
+            with open(os.path.splitext(path)[0] + ".txt", "w") as file:
+                pstats.Stats(self.profile, stream=file).sort_stats("cumulative").print_stats(40)
+        finally:
+            self.profile = None
+            self.path = None
+            TickProfiler.running = None
+        return path
@@ -0,0 +1,38 @@
+from rclpy.qos import DurabilityPolicy, HistoryPolicy, QoSProfile, ReliabilityPolicy
+
+
+# QoS presets, selected per topic group through string node parameters
+QOS_PRESETS = {
+    # Same as the plain depth of 10 the topics used before
+    "default": QoSProfile(
+        history=HistoryPolicy.KEEP_LAST, depth=10,
+        reliability=ReliabilityPolicy.RELIABLE, durability=DurabilityPolicy.VOLATILE
+    ),
+    # Only the newest message matters, stale ones are dropped instead of queued
+    "realtime": QoSProfile(
+        history=HistoryPolicy.KEEP_LAST, depth=1,
+        reliability=ReliabilityPolicy.BEST_EFFORT, durability=DurabilityPolicy.VOLATILE
+    ),
+    # Every message arrives, with room to queue through a slow subscriber
+    "lossless": QoSProfile(
+        history=HistoryPolicy.KEEP_LAST, depth=100,
+        reliability=ReliabilityPolicy.RELIABLE, durability=DurabilityPolicy.VOLATILE
+    ),
+    # The last message is kept for subscribers that join later
+    "latched": QoSProfile(
+        history=HistoryPolicy.KEEP_LAST, depth=1,
+        reliability=ReliabilityPolicy.RELIABLE, durability=DurabilityPolicy.TRANSIENT_LOCAL
+    )
+}
+
+
+def qos_profile(preset):
+    if preset not in QOS_PRESETS:
+        raise ValueError(f"unknown QoS preset '{preset}', expected one of {list(QOS_PRESETS)}")
+    return QOS_PRESETS[preset]
+
+
+def declare_qos_parameter(node, name, default="default"):
+    """Declare a QoS preset parameter on node and return the profile it selects."""
+    node.declare_parameter(name, default)
+    return qos_profile(node.get_parameter(name).value)
@@ -0,0 +1,118 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from sheep_simulation_interfaces.msg import PoseBlock
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.pose_block import make_pose_block
+from sheep_simulation.qos import QOS_PRESETS, qos_profile
+
+
+TOPIC = "sheep_simulation/qos_benchmark/pose_block"
+
+
+def publish_poses(preset, sheep, rate, duration, published):
+    """Publisher process: random-walking keyframe pose blocks for sheep entities at rate Hz."""
+    rclpy.init()
+    node = Node("qos_benchmark_publisher")
+    publisher = node.create_publisher(PoseBlock, TOPIC, qos_profile(preset))
+
+    rng = np.random.default_rng(0)
+    store = FlockStore(capacity=sheep)
+    store.extend([f"sheep{i}" for i in range(sheep)], rng.uniform(-50, 50, sheep), rng.uniform(-50, 50, sheep), np.zeros(sheep))
+
+    def tick():
+        store.x[:] += rng.uniform(-0.5, 0.5, sheep).astype(np.float32)
+        store.y[:] += rng.uniform(-0.5, 0.5, sheep).astype(np.float32)
+        published.value += 1
+        publisher.publish(make_pose_block(store, published.value, node.get_clock().now().to_msg()))
+
+    node.create_timer(1.0 / rate, tick)
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        rclpy.spin_once(node, timeout_sec=0.1)
+
+    node.destroy_node()
+    rclpy.shutdown()
+
+
+class PoseSubscriber(Node):
+    """Stands in for the wolf node: takes work_ms of processing per pose block."""
+
+    def __init__(self, preset, work_ms):
+        super().__init__("qos_benchmark_subscriber")
+        self.work_ms = work_ms
+        self.latencies = []
+        self.seqs = []
+        self.create_subscription(PoseBlock, TOPIC, self.pose_callback, qos_profile(preset))
+
+    def pose_callback(self, msg):
+        # Latency at the start of processing, i.e. including the time spent queued
+        now = self.get_clock().now().nanoseconds
+        self.latencies.append((now - (msg.header.stamp.sec * 1_000_000_000 + msg.header.stamp.nanosec)) / 1e6)
+        self.seqs.append(msg.seq)
+        time.sleep(self.work_ms / 1000.0)
+
+
+def run_preset(preset, args):
+    # A fresh interpreter for the publisher, forking after rclpy.init is not safe
+    context = multiprocessing.get_context("spawn")
+    published = context.Value("L", 0)
+    subscriber = PoseSubscriber(preset, args.work_ms)
+
+    process = context.Process(target=publish_poses, args=(preset, args.sheep, args.rate, args.duration, published))
+    process.start()
+    # Keep taking messages a little past the publisher's end, to drain what was queued
+    end = time.monotonic() + args.duration + 2.0
+    while time.monotonic() < end:
+        rclpy.spin_once(subscriber, timeout_sec=0.1)
+    process.join()
+
+    latencies = np.array(subscriber.latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    result = {
+        "preset": preset,
+        "sheep": args.sheep,
+        "published": published.value,
+        "received": len(subscriber.seqs),
+        "dropped": published.value - len(subscriber.seqs),
+        "latency_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+    }
+    subscriber.destroy_node()
+    return result
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Latency and drops of the QoS presets for a large pose stream")
+    parser.add_argument("--sheep", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=10.0, help="pose blocks per second, the simulation runs at 10")
+    parser.add_argument("--work-ms", type=float, default=150.0, help="subscriber processing time per block, above 1000 / rate means it falls behind")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--presets", nargs="+", default=[p for p in QOS_PRESETS if p != "latched"], choices=list(QOS_PRESETS))
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(args)
+
+    rclpy.init()
+    results = []
+    try:
+        for preset in args.presets:
+            result = run_preset(preset, args)
+            results.append(result)
+            print(
+                f"{preset:<9} received {result['received']}/{result['published']} (dropped {result['dropped']}), "
+                f"latency p50 {result['latency_ms']['p50']:.1f} ms p95 {result['latency_ms']['p95']:.1f} ms p99 {result['latency_ms']['p99']:.1f} ms"
+            )
+    finally:
+        rclpy.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
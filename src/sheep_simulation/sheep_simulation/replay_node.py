@@ -0,0 +1,179 @@
+import time
+
+import rclpy
+from rclpy.node import Node
+from visualization_msgs.msg import MarkerArray
+from sheep_simulation_interfaces.srv import ReplaySeek, ReplaySpeed
+from sheep_simulation.markers import MARKER_MODES, create_marker, pen_markers, PopulationMarker, sheep_states
+from sheep_simulation.qos import declare_qos_parameter
+from sheep_simulation.trajectory_recorder import Recording
+from std_srvs.srv import Trigger
+import numpy as np
+
+
+class ReplayNode(Node):
+    """Plays a recorded run back on the master node's marker topics, see trajectory_recorder.py."""
+
+    MIN_SPEED = 0.1
+    MAX_SPEED = 100.0
+
+    def __init__(self):
+        super().__init__('replay_node')
+
+        self.declare_parameter("sheep_recording", "")  # .npy file written by the sheep node or the engine
+        self.declare_parameter("wolf_recording", "")  # Optional, lined up with the sheep recording by their start times
+        self.declare_parameter("speed", 1.0)  # Times real time, MIN_SPEED to MAX_SPEED
+        self.declare_parameter("publish_rate", 10.0)  # Hz, faster speeds skip ticks rather than publish more often
+        self.declare_parameter("loop", False)  # Start over at the end instead of pausing
+        self.declare_parameter("marker_mode", "sphere_list")  # One of MARKER_MODES
+        self.declare_parameter("marker_state_colors", True)  # Color sheep by state in the single marker modes
+        marker_qos = declare_qos_parameter(self, "marker_qos")
+        pen_qos = declare_qos_parameter(self, "pen_qos", "latched")
+
+        self.marker_mode = self.get_parameter("marker_mode").value
+        if self.marker_mode not in MARKER_MODES:
+            raise ValueError(f"unknown marker mode '{self.marker_mode}', expected one of {MARKER_MODES}")
+        self.marker_state_colors = self.get_parameter("marker_state_colors").value
+        self.loop = self.get_parameter("loop").value
+        publish_rate = self.get_parameter("publish_rate").value
+        if publish_rate <= 0:
+            raise ValueError(f"publish_rate must be positive, got {publish_rate}")
+
+        sheep_path = self.get_parameter("sheep_recording").value
+        if not sheep_path:
+            raise ValueError("sheep_recording must be set to a recorded .npy file")
+        self.sheep = Recording(sheep_path)
+        if len(self.sheep) == 0:
+            raise ValueError(f"{sheep_path} has no recorded ticks, nothing to replay")
+        wolf_path = self.get_parameter("wolf_recording").value
+        self.wolves = Recording(wolf_path) if wolf_path else None
+        self.wolf_offset = self.recording_offset(self.wolves, wolf_path) if self.wolves is not None else 0
+        self.grid = self.sheep.grid
+        self.pen_size = self.sheep.pen_size
+
+        # Per-entity markers are built once from the recorded names, replay only moves them.
+        # They belong to the replay node, each published MarkerArray holds the same objects.
+        self.sheep_markers = [create_marker("sheep", name) for name in self.sheep.names]
+        self.wolf_markers = [create_marker("wolf", name) for name in self.wolves.names] if self.wolves is not None else []
+        self.sheep_population = PopulationMarker("sheep", self.marker_mode)
+        self.wolf_population = PopulationMarker("wolf", self.marker_mode)
+
+        self.sheep_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/sheep_markers', marker_qos)
+        self.wolf_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/wolf_markers', marker_qos)
+        self.pen_marker_publisher = self.create_publisher(MarkerArray, 'sheep_simulation/simulation/pen_markers', pen_qos)
+        self.pen_marker_publisher.publish(pen_markers(self.grid, self.pen_size))
+
+        # Playback controls
+        self.play_service = self.create_service(Trigger, "sheep_simulation/replay/play", self.play_callback)
+        self.pause_service = self.create_service(Trigger, "sheep_simulation/replay/pause", self.pause_callback)
+        self.seek_service = self.create_service(ReplaySeek, "sheep_simulation/replay/seek", self.seek_callback)
+        self.speed_service = self.create_service(ReplaySpeed, "sheep_simulation/replay/speed", self.speed_callback)
+
+        # Playhead in ticks, fractional so slow speeds still advance
+        self.position = 0.0
+        self.published_tick = None
+        self.playing = True
+        self.speed = self.clamp_speed(self.get_parameter("speed").value)
+        self.last_step = time.monotonic()
+        self.timer = self.create_timer(1.0 / publish_rate, self.step)
+
+        self.get_logger().info(f"Replaying {len(self.sheep)} ticks of {len(self.sheep.names)} sheep from {sheep_path}")
+
+    def recording_offset(self, recording, path):
+        """Sheep ticks by which recording starts later than the sheep recording.
+
+        The sheep and wolf nodes each start recording on their first tick with entities, so their rows are lined up by the
+        start time in the sidecars.
+        """
+        if recording.dt != self.sheep.dt:
+            raise ValueError(f"{path} is recorded every {recording.dt} s, the sheep recording every {self.sheep.dt} s")
+        if recording.start_time is None or self.sheep.start_time is None:
+            self.get_logger().warning(f"{path} or the sheep recording has no start time, assuming both start on the same tick")
+            return 0
+        return round((recording.start_time - self.sheep.start_time) / self.sheep.dt)
+
+    def clamp_speed(self, speed):
+        return min(max(speed, self.MIN_SPEED), self.MAX_SPEED)
+
+    def step(self):
+        now = time.monotonic()
+        if self.playing:
+            self.position += (now - self.last_step) * self.speed / self.sheep.dt
+            if self.position >= len(self.sheep):
+                if self.loop:
+                    self.position %= len(self.sheep)
+                else:
+                    self.position = len(self.sheep) - 1
+                    self.playing = False
+                    self.get_logger().info("Replay finished")
+        self.last_step = now
+
+        tick = int(self.position)
+        if tick != self.published_tick:
+            self.publish_tick(tick)
+
+    def publish_tick(self, tick):
+        # Direct indexing into the memory map, seeking costs the same wherever it lands
+        self.published_tick = tick
+        sheep = self.sheep.frame(tick)
+        wolves = self.wolves.frame(tick - self.wolf_offset) if self.wolves is not None else np.zeros((0, 3), dtype=np.float32)
+
+        if self.marker_mode == "entities":
+            self.sheep_marker_publisher.publish(self.entity_markers(self.sheep_markers, sheep))
+            self.wolf_marker_publisher.publish(self.entity_markers(self.wolf_markers, wolves))
+        else:
+            states = sheep_states(self.grid, self.pen_size, sheep[:, 0], sheep[:, 1], wolves[:, 0], wolves[:, 1]) if self.marker_state_colors else None
+            self.sheep_marker_publisher.publish(self.sheep_population.update(sheep[:, 0], sheep[:, 1], states))
+            self.wolf_marker_publisher.publish(self.wolf_population.update(wolves[:, 0], wolves[:, 1]))
+
+    def entity_markers(self, markers, poses):
+        msg = MarkerArray()
+        for marker, (x, y) in zip(markers, poses[:, :2].tolist()):
+            marker.pose.position.x = x
+            marker.pose.position.y = y
+        msg.markers = markers[:len(poses)]
+        return msg
+
+    def play_callback(self, request, response):
+        if self.position >= len(self.sheep) - 1:
+            self.position = 0.0
+        self.playing = True
+        self.last_step = time.monotonic()
+        response.success = True
+        response.message = f"playing from tick {int(self.position)}"
+        return response
+
+    def pause_callback(self, request, response):
+        self.playing = False
+        response.success = True
+        response.message = f"paused at tick {int(self.position)}"
+        return response
+
+    def seek_callback(self, request, response):
+        if request.tick >= len(self.sheep):
+            response.success = False
+            response.message = f"tick {request.tick} is past the end of the recording ({len(self.sheep)} ticks)"
+        else:
+            self.position = float(request.tick)
+            self.publish_tick(request.tick)
+            response.success = True
+            response.message = f"at tick {request.tick}"
+        response.tick = int(self.position)
+        return response
+
+    def speed_callback(self, request, response):
+        if not self.MIN_SPEED <= request.speed <= self.MAX_SPEED:
+            response.success = False
+            response.message = f"speed must be between {self.MIN_SPEED} and {self.MAX_SPEED}"
+        else:
+            self.speed = request.speed
+            response.success = True
+        response.speed = self.speed
+        return response
+
+
+def main(args=None):
+    rclpy.init(args=args)
+    node = ReplayNode()
+    rclpy.spin(node)
+    rclpy.shutdown()
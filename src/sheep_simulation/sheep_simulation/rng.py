@@ -0,0 +1,19 @@
+import numpy as np
+
+
+# Each node draws from its own stream of the simulation seed, so one node's
+# draws never shift another's and a seeded run replays bit for bit
+MASTER_STREAM = 0
+SHEEP_STREAM = 1
+FLOCK_STREAM = 2  # Flocks generated by the sheep node, sub-streamed per request
+
+
+def make_rng(seed=None, stream=0):
+    """numpy Generator for one stream of a simulation seed, None (or a negative seed) draws fresh entropy.
+
+    stream is an int, or a tuple of ints for a sub-stream.
+    """
+    if seed is not None and seed < 0:
+        seed = None
+    spawn_key = tuple(stream) if isinstance(stream, tuple) else (stream,)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
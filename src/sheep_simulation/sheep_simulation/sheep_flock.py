@@ -0,0 +1,131 @@
+import numpy as np
+
+from sheep_simulation.PsuedoSheepSeperationPort import PsuedoSheep
+from sheep_simulation.constants import WOLF_FLEE_DIST
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.neighbor_index import make_neighbor_index
+from sheep_simulation.pen_occupancy import PenOccupancy
+from sheep_simulation.profiling import NULL_PHASES
+from sheep_simulation.rng import SHEEP_STREAM, make_rng
+
+
+class SheepFlock():
+    """Sheep behaviour for one tick: random walk, fleeing wolves towards the pen and boids."""
+
+    # Sheep flee from wolves closer than this
+    WOLF_FLEE_DIST = WOLF_FLEE_DIST
+
+    def __init__(self, arena, sheep=None, neighbor_backend="grid", rng=None):
+        self.arena = arena
+        self.rng = rng if rng is not None else make_rng(stream=SHEEP_STREAM)
+
+        # Poses of all sheep
+        self.sheep = sheep if sheep is not None else FlockStore()
+
+        # Spatial index over the flock for the boids, cell size covers the cohesion radius
+        self.flock_index = make_neighbor_index(neighbor_backend, cell_size=PsuedoSheep.COHESSION_DIST)
+
+        # Sheep in the pen, kept up to date from the sheep that move each tick
+        self.pen_occupancy = PenOccupancy(arena.pen_x_min, arena.pen_y_min)
+
+        # Times the phases of step(), the sheep node swaps in its PhaseTimer
+        self.phases = NULL_PHASES
+
+    def spawn(self, names, x, y, theta):
+        return self.sheep.extend(names, x, y, theta)
+
+    def step(self, wolves):
+        """Advance the flock one tick given an [W,2] array of wolf positions."""
+        grid = self.arena.grid
+
+        phases = self.phases
+
+        if self.sheep_safe():
+            with phases.time("in_pen"):
+                moved = self.update_sheep_in_pen()
+        else:
+            # Wolves are looked up from the poses at the start of the tick. There are only a few,
+            # so they are compared with every sheep and the index is built once, after the move.
+            with phases.time("wolf_distance"):
+                closest_wolves = self.find_closest_wolves(self.sheep.poses(), wolves)
+            with phases.time("move"):
+                moved = self.update_sheep_position(closest_wolves)
+
+            # Boids run on the poses after fleeing and the random walk, as in the per-sheep path.
+            # query_pairs is lazy, the pairs are collected here so the neighbour search is timed with the index
+            with phases.time("neighbor_index"):
+                flock = self.sheep.poses()
+                self.flock_index.build(flock)
+                pairs = list(self.flock_index.query_pairs(PsuedoSheep.COHESSION_DIST))
+            with phases.time("boids"):
+                steps = PsuedoSheep.step_flock(flock, pairs)
+
+                self.sheep.x[:] += steps[:, 0]
+                self.sheep.y[:] += steps[:, 1]
+                self.sheep.theta[:] += steps[:, 2]
+                moved |= (steps[:, 0] != 0) | (steps[:, 1] != 0)
+
+        with phases.time("pen_occupancy"):
+            np.clip(self.sheep.x, grid[0][0], grid[0][1], out=self.sheep.x)
+            np.clip(self.sheep.y, grid[1][0], grid[1][1], out=self.sheep.y)
+
+            # Only sheep that moved can have entered or left the pen
+            self.pen_occupancy.update(self.sheep.x, self.sheep.y, moved)
+
+    def sheep_safe(self):
+        # Sheep spawned since the last tick haven't been counted yet
+        self.pen_occupancy.track_new(self.sheep.x, self.sheep.y)
+        return self.pen_occupancy.all_penned
+
+    def update_sheep_in_pen(self):
+        moved = np.ones(len(self.sheep), dtype=bool)
+        self.random_walk(moved)
+
+        np.maximum(self.sheep.x, self.arena.pen_x_min, out=self.sheep.x)
+        np.maximum(self.sheep.y, self.arena.pen_x_min, out=self.sheep.y)
+
+        return moved
+
+    def find_closest_wolves(self, flock, wolves):
+        """[N,2] position of the closest wolf within WOLF_FLEE_DIST of each sheep, NaN where there is none."""
+        closest_wolves = np.full((len(flock), 2), np.nan)
+        if len(wolves) == 0 or len(flock) == 0:
+            return closest_wolves
+
+        # [W,N] squared distances, first wolf wins ties
+        wolves = np.asarray(wolves, dtype=float)[:, :2]
+        squared_distances = (flock[None, :, 0] - wolves[:, None, 0]) ** 2 + (flock[None, :, 1] - wolves[:, None, 1]) ** 2
+        closest = np.argmin(squared_distances, axis=0)
+        near = squared_distances[closest, np.arange(len(flock))] < self.WOLF_FLEE_DIST ** 2
+
+        closest_wolves[near] = wolves[closest[near]]
+        return closest_wolves
+
+    def update_sheep_position(self, closest_wolves):
+        arena = self.arena
+        x, y = self.sheep.x, self.sheep.y
+
+        in_pen = (arena.pen_x_min <= x) & (x <= arena.pen_x_max) & (arena.pen_y_min <= y) & (y <= arena.pen_y_max)
+        fleeing = ~in_pen & ~np.isnan(closest_wolves[:, 0])
+
+        # Sheep near a wolf head between the pen and directly away from the wolf
+        theta_to_pen = np.arctan2(arena.pen_center_y - y[fleeing], arena.pen_center_x - x[fleeing])
+        theta_away_from_wolf = np.arctan2(
+            y[fleeing] - closest_wolves[fleeing, 1],
+            x[fleeing] - closest_wolves[fleeing, 0]
+        )
+        combined_theta = (theta_to_pen + theta_away_from_wolf) / 2
+        x[fleeing] += np.cos(combined_theta) * 0.5
+        y[fleeing] += np.sin(combined_theta) * 0.5
+
+        # The rest of the flock outside the pen wanders
+        walking = ~in_pen & ~fleeing
+        self.random_walk(walking)
+
+        return fleeing | walking
+
+    def random_walk(self, mask):
+        # Noise for the whole flock in one draw, so the stream advances the same whichever sheep walk
+        noise = self.rng.uniform(-0.5, 0.5, (len(self.sheep), 2))
+        self.sheep.x[mask] += noise[mask, 0]
+        self.sheep.y[mask] += noise[mask, 1]
@@ -1,10 +1,19 @@
 import rclpy
 from rclpy.node import Node
-from sheep_simulation_interfaces.msg import EntityPose, EntityPoseArray
-from sheep_simulation_interfaces.srv import EntitySpawn, Grid
-from sheep_simulation.PsuedoSheepSeperationPort import PsuedoSheep
-import math
-import random
+from sheep_simulation_interfaces.msg import EntityPose, EntityPoseArray, Grid, HerdingMetrics, PenOccupancy, PoseBlock
+from sheep_simulation_interfaces.srv import EntityNames, EntitySpawn, GenerateFlock
+from sheep_simulation.arena import Arena
+from sheep_simulation.diagnostics import NodeProfiling
+from sheep_simulation.flock_layout import FLOCK_LAYOUTS
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.metrics import HerdingMetricsTracker
+from sheep_simulation.pose_block import fill_entity_names
+from sheep_simulation.pose_stream import PoseDeltaEncoder, PoseStream
+from sheep_simulation.qos import declare_qos_parameter, qos_profile
+from sheep_simulation.trajectory_recorder import TrajectoryRecorder
+from sheep_simulation.rng import FLOCK_STREAM, SHEEP_STREAM, make_rng
+from sheep_simulation.sheep_flock import SheepFlock
+from std_srvs.srv import Trigger
 import numpy as np
 
 
@@ -14,30 +23,59 @@ class SheepSimulationNode(Node):
         # Timer for sheep logic
         self.timer = self.create_timer(0.1, self.update_simulation)
 
-        # List of all sheep
-        self.sheep = []
+        # Phase timings on /diagnostics and cProfile snapshots, see diagnostics.py
+        self.profiling = NodeProfiling(self, "sheep", tick_period=0.1)
+        self.phases = self.profiling.phases
 
-        # Services
-        self.sheep_spawn_service = self.create_service(EntitySpawn, "sheep_simulation/sheep/spawn", self.sheep_spawn_callback)
+        # Poses of all sheep
+        self.sheep = FlockStore()
 
-        # Clients
-        self.grid_init_client = self.create_client(Grid, 'sheep_simulation/grid')
-        while not self.grid_init_client.wait_for_service(timeout_sec=1.0):
-            self.get_logger().info('Waiting for grid service...')
+        self.declare_parameter("neighbor_backend", "grid")
+        self.declare_parameter("seed", -1)  # Negative for an unseeded run
+        self.declare_parameter("publish_legacy_pose", False)  # Also publish EntityPoseArray on sheep_simulation/sheep/pose
+        self.declare_parameter("pose_delta_epsilon", 0.01)  # Sheep that moved less than this, and turned less than this in radians, since last sent are left out of a delta
+        self.declare_parameter("pose_keyframe_interval", 10)  # Ticks between keyframes, 1 to only send keyframes
+        pose_qos = declare_qos_parameter(self, "pose_qos")  # QoS preset for the pose topics, see qos.py
 
-        # Publishers
-        self.sheep_position_publisher = self.create_publisher(EntityPoseArray, 'sheep_simulation/sheep/pose', 10)
+        # Trajectory recording, see trajectory_recorder.py
+        self.declare_parameter("record_path", "")  # .npy file to record sheep poses to, empty to not record
+        self.declare_parameter("record_max_ticks", 10000)  # Ticks the file has room for
+        self.declare_parameter("record_capacity", 0)  # Sheep the file has room for, 0 to grow the file with the sheep
+        self.recorder = None
 
-        # Subscribers
-        # self.grid_subscription = self.create_subscription(Grid, 'sheep_simulation/gtid', self.grid_initialisation_callback, 10)
-        self.wolf_position_subscription = self.create_subscription(EntityPoseArray, 'sheep_simulation/wolf/pose', self.wolf_position_callback, 10)
+        # Services, spawning is only offered once the grid is known (see set_arena)
+        self.sheep_spawn_service = None
+        self.generate_flock_service = None
+        self.sheep_names_service = self.create_service(EntityNames, "sheep_simulation/sheep/names", self.sheep_names_callback)
+        self.sheep_keyframe_service = self.create_service(Trigger, "sheep_simulation/sheep/keyframe", self.sheep_keyframe_callback)
 
-        # Tracking wolf positions
-        self.wolf_positions = {}
+        # Publishers
+        self.sheep_pose_block_publisher = self.create_publisher(PoseBlock, 'sheep_simulation/sheep/pose_block', pose_qos)
+        self.sheep_pose_encoder = PoseDeltaEncoder(
+            epsilon=self.get_parameter("pose_delta_epsilon").value,
+            keyframe_interval=self.get_parameter("pose_keyframe_interval").value
+        )
+        self.sheep_position_publisher = None
+        if self.get_parameter("publish_legacy_pose").value:
+            self.sheep_position_publisher = self.create_publisher(EntityPoseArray, 'sheep_simulation/sheep/pose', pose_qos)
+        self.pen_occupancy_publisher = self.create_publisher(PenOccupancy, 'sheep_simulation/sheep/pen_occupancy', 10)
+
+        # Herding KPIs are updated every tick and published at metrics_rate
+        self.declare_parameter("metrics_rate", 1.0)  # Hz, 0 to not publish metrics
+        self.metrics = None
+        self.metrics_publisher = self.create_publisher(HerdingMetrics, 'sheep_simulation/metrics', 10)
+        metrics_rate = self.get_parameter("metrics_rate").value
+        if metrics_rate > 0:
+            self.metrics_timer = self.create_timer(1.0 / metrics_rate, self.publish_metrics)
 
-        self.init_grid()
+        # Subscribers
+        # The grid is latched, so it arrives whenever this node starts. When composed in one process set_arena is called directly instead
+        self.grid_subscription = self.create_subscription(Grid, 'sheep_simulation/grid', self.grid_initialisation_callback, qos_profile("latched"))
+        self.wolf_position_subscription = self.create_subscription(PoseBlock, 'sheep_simulation/wolf/pose_block', self.wolf_position_callback, pose_qos)
 
-        self.boids = PsuedoSheep(logger=self.get_logger())
+        # Tracking wolf positions, indexed by the wolf node's entity ids
+        self.wolves = FlockStore(capacity=4)
+        self.wolf_stream = PoseStream(self.wolves, keyframe_client=self.create_client(Trigger, 'sheep_simulation/wolf/keyframe'))
 
         # # Pen location (defined in master_node.py)
         # self.pen_x_min = 25.0 - 10.0
@@ -47,166 +85,190 @@ class SheepSimulationNode(Node):
         # self.pen_center_x = (self.pen_x_min + self.pen_x_max) / 2
         # self.pen_center_y = (self.pen_y_min + self.pen_y_max) / 2
 
-    def init_grid(self):
-        # Create request
-        grid_request = Grid.Request()
-
-        future = self.grid_init_client.call_async(grid_request)
-
-        rclpy.spin_until_future_complete(self, future)
-
-        self.grid = [
-            [future.result().xmin, future.result().xmax],
-            [future.result().ymin, future.result().ymax]
-        ]
-
-        pen_size = future.result().pensize
-
-        self.pen_x_min = self.grid[0][1] - pen_size
-        self.pen_y_min = self.grid[1][1] - pen_size
-        self.pen_x_max = self.grid[0][1]
-        self.pen_y_max = self.grid[1][1]
-        self.pen_center_x = self.pen_x_min + pen_size/2
-        self.pen_center_y = self.pen_y_min + pen_size/2
+    def set_arena(self, arena):
+        # Sheep behaviour lives in SheepFlock, this node only moves data in and out of ROS
+        self.arena = arena
+        self.grid = arena.grid
+        self.flock = SheepFlock(
+            arena,
+            sheep=self.sheep,
+            neighbor_backend=self.get_parameter("neighbor_backend").value,
+            rng=make_rng(self.get_parameter("seed").value, SHEEP_STREAM)
+        )
+        self.flock.phases = self.phases
+        self.metrics = HerdingMetricsTracker(arena)
+
+        # The spawn services appearing is the master's signal that this node is ready
+        if self.sheep_spawn_service is None:
+            self.sheep_spawn_service = self.create_service(EntitySpawn, "sheep_simulation/sheep/spawn", self.sheep_spawn_callback)
+            self.generate_flock_service = self.create_service(GenerateFlock, "sheep_simulation/sheep/generate", self.generate_flock_callback)
 
     def sheep_spawn_callback(self, request, response):
         try:
-            for sheep in request.spawn_entities:
-
-                sheep_obj = {
-                    "name": sheep.name,
-                    "pose": {
-                        "x": sheep.x,
-                        "y": sheep.y,
-                        "theta": sheep.theta
-                    }
-                }
-
-                self.sheep.append(sheep_obj)
-                response.result = "ok"
-                self.get_logger().info(f"Spawned sheep: {sheep.name} at ({sheep.x}, {sheep.y})")
+            entities = request.spawn_entities
+            handles = self.sheep.extend(
+                [sheep.name for sheep in entities],
+                [sheep.x for sheep in entities],
+                [sheep.y for sheep in entities],
+                [sheep.theta for sheep in entities]
+            )
+            response.ids = handles.tolist()
+            response.result = "ok"
+            self.log_spawned(handles)
         except Exception as e:
             response.result = "fail"
             self.get_logger().error(f"Failed to spawn sheep: {e}")
         return response
 
+    def generate_flock_callback(self, request, response):
+        # Bulk spawn without the poses crossing the wire, the flock is drawn here from the seed
+        try:
+            if not hasattr(self, "grid"):
+                raise RuntimeError("grid not initialised yet")
+
+            rng = make_rng(request.seed, (FLOCK_STREAM, request.stream))
+            poses = FLOCK_LAYOUTS[request.distribution](request.count, self.grid, rng)
+            handles = self.sheep.extend(
+                [f"{request.name_prefix}{i + 1}" for i in range(request.count)],
+                poses[:, 0], poses[:, 1], poses[:, 2]
+            )
+            response.first_id = int(handles[0]) if len(handles) > 0 else len(self.sheep)
+            response.count = len(handles)
+            response.result = "ok"
+            self.log_spawned(handles)
+        except Exception as e:
+            response.result = "fail"
+            self.get_logger().error(f"Failed to generate flock: {e}")
+        return response
+
+    def log_spawned(self, handles):
+        # One line per batch, not per sheep
+        if len(handles) > 0:
+            self.get_logger().info(
+                f"Spawned {len(handles)} sheep: {self.sheep.names[handles[0]]} .. {self.sheep.names[handles[-1]]}, {len(self.sheep)} in total"
+            )
+
+    def sheep_names_callback(self, request, response):
+        return fill_entity_names(self.sheep, request, response)
+
+    def sheep_keyframe_callback(self, request, response):
+        self.sheep_pose_encoder.request_keyframe()
+        response.success = True
+        return response
+
     def wolf_position_callback(self, msg):
-        for wolf in msg.entity_positions:
-            self.wolf_positions[wolf.name] = (wolf.x, wolf.y)
+        with self.phases.time("wolf_pose_block"):
+            self.wolf_stream.apply(msg)
 
     def grid_initialisation_callback(self, msg):
-        self.grid = [
+        grid = [
             [msg.xmin, msg.xmax],
             [msg.ymin, msg.ymax]
         ]
 
-        self.pen_x_min = self.grid[0][1] - 10.0
-        self.pen_y_min = self.grid[1][1] - 10.0
-        self.pen_x_max = self.grid[0][1]
-        self.pen_y_max = self.grid[1][1]
-        self.pen_center_x = (self.pen_x_min + self.pen_x_max) / 2
-        self.pen_center_y = (self.pen_y_min + self.pen_y_max) / 2
+        self.set_arena(Arena(grid, msg.pensize))
 
     def update_simulation(self):
         if not hasattr(self, "grid"):
             return
-        
-        positions = []
-        for sheep in self.sheep:
-            if self.sheep_safe():
-                sheep["pose"] = self.update_sheep_in_pen(sheep["pose"])
-            else:
-                sheep["pose"] = self.update_sheep_position(sheep["pose"])
-
-                localsheep = np.array([
-                    sheep["pose"]["x"],
-                    sheep["pose"]["y"],
-                    sheep["pose"]["theta"]
-                ])
-                globalsheep = np.array([
-                    [sheep["pose"]["x"],
-                    sheep["pose"]["y"],
-                    sheep["pose"]["theta"]]
-                    for sheep in self.sheep
-                ])
-                dx, dy, dtheta = self.boids.update_velocity(localsheep, globalsheep)
-
-                sheep["pose"]["x"] += dx
-                sheep["pose"]["y"] += dy
-                sheep["pose"]["theta"] += dtheta
-
-            sheep["pose"]["x"] = max(self.grid[0][0], min(sheep["pose"]["x"], self.grid[0][1]))
-            sheep["pose"]["y"] = max(self.grid[1][0], min(sheep["pose"]["y"], self.grid[1][1]))
 
-            entity = EntityPose()
-            entity.name = sheep["name"]
-            entity.x = sheep["pose"]["x"]
-            entity.y = sheep["pose"]["y"]
-            entity.theta = sheep["pose"]["theta"]
-            positions.append(entity)
-        
-        self.publish_sheep_positions(positions)
-
-    def sheep_safe(self):
-        return all([(sheep["pose"]["x"] >= self.pen_x_min) and (sheep["pose"]["y"] >= self.pen_y_min) for sheep in self.sheep])
-    
-    def update_sheep_in_pen(self, sheep_pose):
-        sheep_pose = self.random_walk(sheep_pose)
+        with self.profiling.tick():
+            self.flock.step(np.column_stack([self.wolves.x, self.wolves.y]))
+            with self.phases.time("metrics"):
+                self.metrics.update(self.sheep, self.wolves, self.flock.pen_occupancy)
+            with self.phases.time("pen_occupancy_publish"):
+                self.publish_pen_occupancy()
+            self.publish_sheep_positions()
+            with self.phases.time("record"):
+                self.record_tick()
+
+    def record_tick(self):
+        # Starts with the first tick that has sheep, record() itself never blocks the tick
+        if self.recorder is None:
+            path = self.get_parameter("record_path").value
+            if not path or len(self.sheep) == 0:
+                return
+            self.recorder = TrajectoryRecorder(
+                path, self.sheep, self.arena,
+                max_ticks=self.get_parameter("record_max_ticks").value,
+                capacity=self.get_parameter("record_capacity").value or None,
+                start_time=self.get_clock().now().nanoseconds / 1e9
+            )
+            self.get_logger().info(f"Recording sheep poses to {self.recorder.path}")
+
+        truncated = self.recorder.truncated
+        self.recorder.record()
+        if self.recorder.truncated and not truncated:
+            self.get_logger().warning(
+                f"{len(self.sheep)} sheep outgrew record_capacity {self.recorder.capacity}, "
+                "sheep past it are not recorded"
+            )
 
-        sheep_pose["x"] = max(self.pen_x_min, sheep_pose["x"])
-        sheep_pose["y"] = max(self.pen_x_min, sheep_pose["y"])
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
 
-        return sheep_pose
+    def publish_sheep_positions(self):
+        with self.phases.time("pose_encode"):
+            msg = self.sheep_pose_encoder.encode(self.sheep, self.get_clock().now().to_msg())
+        with self.phases.time("pose_publish"):
+            self.sheep_pose_block_publisher.publish(msg)
 
-    def update_sheep_position(self, sheep_pose):
-        
-        def is_in_pen(x, y):
-            return self.pen_x_min <= x <= self.pen_x_max and self.pen_y_min <= y <= self.pen_y_max
+        if self.sheep_position_publisher is not None:
+            with self.phases.time("legacy_pose_publish"):
+                self.publish_legacy_sheep_positions()
 
-        if is_in_pen(sheep_pose["x"], sheep_pose["y"]):
-            return sheep_pose
+    def publish_legacy_sheep_positions(self):
+        positions = []
+        for name, x, y, theta in zip(self.sheep.names, self.sheep.x.tolist(), self.sheep.y.tolist(), self.sheep.theta.tolist()):
+            entity = EntityPose()
+            entity.name = name
+            entity.x = x
+            entity.y = y
+            entity.theta = theta
+            positions.append(entity)
 
-        if self.wolf_positions:
-            closest_wolf = min(
-                self.wolf_positions.values(),
-                key=lambda wolf_pos: math.hypot(wolf_pos[0] - sheep_pose["x"], wolf_pos[1] - sheep_pose["y"])
-            )
-            distance = math.hypot(closest_wolf[0] - sheep_pose["x"], closest_wolf[1] - sheep_pose["y"])
-
-            if distance < 10.0:
-                delta_x = self.pen_center_x - sheep_pose["x"]
-                delta_y = self.pen_center_y - sheep_pose["y"]
-                theta_to_pen = math.atan2(delta_y, delta_x)
-
-                delta_wolf_x = sheep_pose["x"] - closest_wolf[0]
-                delta_wolf_y = sheep_pose["y"] - closest_wolf[1]
-                theta_away_from_wolf = math.atan2(delta_wolf_y, delta_wolf_x)
-
-                combined_theta = (theta_to_pen + theta_away_from_wolf) / 2
-                sheep_pose["x"] += math.cos(combined_theta) * 0.5
-                sheep_pose["y"] += math.sin(combined_theta) * 0.5
-            else:
-                sheep_pose = self.random_walk(sheep_pose)
-        else:
-            sheep_pose = self.random_walk(sheep_pose)
-        
-        return sheep_pose
-
-    def random_walk(self, pose):
-        return {
-            "x": pose["x"] + random.uniform(-0.5, 0.5),
-            "y": pose["y"] + random.uniform(-0.5, 0.5),
-            "theta": pose["theta"]
-        }
-
-    def publish_sheep_positions(self, positions):
         msg = EntityPoseArray()
         msg.entity_positions = positions
         self.sheep_position_publisher.publish(msg)
 
+    def publish_pen_occupancy(self):
+        pen_occupancy = self.flock.pen_occupancy
+
+        msg = PenOccupancy()
+        msg.tick = pen_occupancy.tick
+        msg.penned = pen_occupancy.penned
+        msg.total = pen_occupancy.total
+        msg.all_penned = pen_occupancy.all_penned
+        msg.full_pen_tick = pen_occupancy.full_pen_tick if pen_occupancy.full_pen_tick is not None else -1
+        self.pen_occupancy_publisher.publish(msg)
+
+    def publish_metrics(self):
+        if self.metrics is None:
+            return
+
+        metrics = self.metrics
+        msg = HerdingMetrics()
+        msg.header.stamp = self.get_clock().now().to_msg()
+        msg.header.frame_id = "map"
+        msg.tick = metrics.tick
+        msg.penned = metrics.penned
+        msg.total = metrics.total
+        msg.time_to_pen = metrics.time_to_pen if metrics.time_to_pen is not None else -1
+        msg.dispersion = metrics.dispersion
+        msg.max_pen_distance = metrics.max_pen_distance
+        msg.wolf_path_length = metrics.wolf_path_length
+        msg.wolf_path_lengths = metrics.wolf_path_lengths.tolist()
+        self.metrics_publisher.publish(msg)
+
 
 def main(args=None):
     rclpy.init(args=args)
     node = SheepSimulationNode()
-    rclpy.spin(node)
-    rclpy.shutdown()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.stop_recording()
+    rclpy.try_shutdown()
@@ -0,0 +1,112 @@
+import math
+import os
+
+import numpy as np
+
+from sheep_simulation.arena import Arena
+from sheep_simulation.metrics import HerdingMetricsTracker
+from sheep_simulation.rng import MASTER_STREAM, SHEEP_STREAM, make_rng
+from sheep_simulation.sheep_flock import SheepFlock
+from sheep_simulation.trajectory_recorder import TrajectoryRecorder
+from sheep_simulation.wolf_pack import WolfPack
+
+
+class SimulationEngine():
+    """Headless herding simulation, no ROS required.
+
+    Steps the sheep and the wolves in lockstep as fast as the CPU allows:
+    each tick the sheep react to the current wolf positions, then the wolves
+    react to the updated sheep.
+    """
+
+    def __init__(self, grid_size=50.0, pen_size=10.0, neighbor_backend="grid", seed=None):
+        self.seed = seed
+        self.rng = make_rng(seed, MASTER_STREAM)  # Spawning, same stream the master node uses
+
+        self.arena = Arena(Arena.create_grid(grid_size), pen_size)
+        self.sheep = SheepFlock(self.arena, neighbor_backend=neighbor_backend, rng=make_rng(seed, SHEEP_STREAM))
+        # The wolves read the sheep poses straight from the flock's store
+        self.wolves = WolfPack(self.arena, sheep=self.sheep.sheep)
+        self.metrics = HerdingMetricsTracker(self.arena)
+        self.tick = 0
+        self.recorders = []
+
+    def spawn_sheep(self, names, x, y, theta=None):
+        theta = np.zeros(len(names)) if theta is None else theta
+        return self.sheep.spawn(names, x, y, theta)
+
+    def spawn_wolves(self, names, x, y, theta=None):
+        theta = np.zeros(len(names)) if theta is None else theta
+        handles = self.wolves.spawn(names, x, y, theta)
+        self.metrics.add_wolves(self.wolves.wolves)
+        return handles
+
+    def spawn_default(self, sheep_count=100, wolf_count=2):
+        """Same setup as the master node: sheep in two groups anywhere on the grid, wolves in their pens."""
+        grid = self.arena.grid
+        for group in range(2):
+            count = sheep_count // 2 + (sheep_count % 2 if group == 0 else 0)
+            self.spawn_sheep(
+                [f"group{group + 1}_sheep{i + 1}" for i in range(count)],
+                self.rng.uniform(grid[0][0], grid[0][1], count),
+                self.rng.uniform(grid[1][0], grid[1][1], count)
+            )
+
+        pens = [self.arena.wolf_pen_location(i) for i in range(wolf_count)]
+        self.spawn_wolves(
+            [f"wolf{i + 1}" for i in range(wolf_count)],
+            [pen[0] for pen in pens],
+            [pen[1] for pen in pens]
+        )
+
+    @property
+    def all_penned(self):
+        return self.sheep.sheep_safe()
+
+    def step(self):
+        """Advance both populations one tick and return the new state."""
+        wolves = self.wolves.wolves
+        self.sheep.step(np.column_stack([wolves.x, wolves.y]))
+        self.wolves.step(self.sheep.pen_occupancy.all_penned)
+        self.metrics.update(self.sheep.sheep, self.wolves.wolves, self.sheep.pen_occupancy)
+
+        self.tick += 1
+        for recorder in self.recorders:
+            recorder.record()
+        return self.state()
+
+    def record(self, directory, max_ticks, sheep_capacity=None):
+        """Record every following tick to sheep.npy and wolves.npy in directory, see TrajectoryRecorder.
+
+        The files grow with entities spawned later, with a sheep_capacity the sheep file is fixed to that many.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # Both record from the next tick on, in the 0.1 s ticks of the simulation nodes
+        start_time = (self.tick + 1) * 0.1
+        self.recorders = [
+            TrajectoryRecorder(os.path.join(directory, "sheep.npy"), self.sheep.sheep, self.arena, max_ticks, sheep_capacity, start_time=start_time),
+            TrajectoryRecorder(os.path.join(directory, "wolves.npy"), self.wolves.wolves, self.arena, max_ticks, start_time=start_time)
+        ]
+
+    def stop_recording(self):
+        for recorder in self.recorders:
+            recorder.close()
+        self.recorders = []
+
+    def run(self, max_ticks=math.inf, until_penned=True):
+        """Step until max_ticks, or until the whole flock is penned. Returns the number of ticks run."""
+        start = self.tick
+        while self.tick - start < max_ticks:
+            if until_penned and len(self.sheep.sheep) > 0 and self.all_penned:
+                break
+            self.step()
+        return self.tick - start
+
+    def state(self):
+        """Current sheep and wolf poses as [N,3] float32 arrays of (x, y, theta) rows."""
+        sheep, wolves = self.sheep.sheep, self.wolves.wolves
+        return {
+            "tick": self.tick,
+            "sheep": np.column_stack([sheep.x, sheep.y, sheep.theta]),
+            "wolves": np.column_stack([wolves.x, wolves.y, wolves.theta]),
+        }
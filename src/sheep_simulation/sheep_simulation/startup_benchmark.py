@@ -0,0 +1,101 @@
+import argparse
+import json
+import random
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+import rclpy
+from rclpy.node import Node
+from sheep_simulation_interfaces.msg import PoseBlock
+from sheep_simulation.composition_benchmark import LAYOUTS, percentiles
+
+
+class SpawnProbe(Node):
+    """Waits for the first sheep pose block that carries the whole flock."""
+
+    def __init__(self):
+        super().__init__("startup_benchmark_probe")
+        self.flock_size = 0
+        self.create_subscription(PoseBlock, "sheep_simulation/sheep/pose_block", self.pose_callback, 10)
+
+    def pose_callback(self, msg):
+        self.flock_size = max(self.flock_size, msg.count)
+
+
+def cold_start(name, probe, sheep, timeout, shuffle, ros_args):
+    """Start a layout and return the seconds until every sheep is spawned and simulated, None on timeout."""
+    commands = list(LAYOUTS[name])
+    if shuffle:
+        random.shuffle(commands)
+
+    probe.flock_size = 0
+    start = time.monotonic()
+    processes = [
+        subprocess.Popen(command + ["--ros-args", "-p", f"sheep_count:={sheep}"] + ros_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for command in commands
+    ]
+    try:
+        while probe.flock_size < sheep and time.monotonic() - start < timeout:
+            rclpy.spin_once(probe, timeout_sec=0.01)
+        elapsed = time.monotonic() - start
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+
+    return elapsed if probe.flock_size >= sheep else None
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Cold start time, from launching the nodes until the whole flock is being simulated")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--sheep", type=int, default=100)
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--shuffle", action="store_true", help="start the nodes in a random order on every run")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a run counts as failed")
+    parser.add_argument("--target", type=float, help="fail (exit code 1) if any run takes longer than this many seconds")
+    parser.add_argument("--ros-args", dest="ros_args", nargs=argparse.REMAINDER, default=[], help="passed on to every simulation process")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args(args)
+
+    rclpy.init()
+    probe = SpawnProbe()
+    results = []
+    try:
+        for name in args.layouts:
+            times = [cold_start(name, probe, args.sheep, args.timeout, args.shuffle, args.ros_args) for _ in range(args.runs)]
+            finished = [t for t in times if t is not None]
+            result = {
+                "layout": name,
+                "sheep": args.sheep,
+                "runs": args.runs,
+                "timeouts": len(times) - len(finished),
+                "startup_ms": percentiles(np.array(finished) * 1000.0),
+                "max_s": max(finished) if finished else None
+            }
+            results.append(result)
+            print(
+                f"{name:<9} startup p50 {result['startup_ms']['p50'] or float('nan'):.0f} ms "
+                f"p95 {result['startup_ms']['p95'] or float('nan'):.0f} ms, {result['timeouts']} of {args.runs} runs timed out"
+            )
+    finally:
+        probe.destroy_node()
+        rclpy.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.target is not None:
+        slow = [r["layout"] for r in results if r["timeouts"] or r["max_s"] > args.target]
+        if slow:
+            print(f"cold start over the {args.target} s target: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
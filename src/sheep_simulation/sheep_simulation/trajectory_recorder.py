@@ -0,0 +1,244 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+class TrajectoryRecorder():
+    """Records the poses of a FlockStore every tick into a memory-mapped .npy file.
+
+    The file is preallocated as float32 [max_ticks, capacity, 3] of
+    (x, y, theta) rows, so it opens with np.load(path, mmap_mode="r").
+    record() copies the live poses into one of a fixed ring of buffers and
+    returns, a writer thread moves them into the file. Only window_ticks
+    rows are mapped at a time, so nothing is allocated per tick and RAM use
+    stays at the ring plus one window however long the run. If the writer
+    falls behind the frame is dropped instead of blocking the tick, dropped
+    rows are listed in the sidecar.
+
+    Without a capacity the file starts sized for the entities in the store
+    and doubles whenever they outgrow it. The writer rewrites the rows
+    recorded so far into the wider file, which is cheap while a flock is
+    still being spawned. With a capacity the file is fixed and entities past
+    it are left out, see truncated.
+
+    A JSON sidecar next to the file (same name, .json) holds the entity
+    names, the grid and pen geometry and what was actually recorded. The
+    writer refreshes it whenever it finishes a window, so a run that is
+    killed can still be replayed up to its last flushed window. Its
+    start_time is the clock time of the first row in seconds, recordings of
+    the sheep and the wolf node start on different ticks and are lined up by
+    it on replay.
+    """
+
+    def __init__(self, path, store, arena, max_ticks, capacity=None, buffers=8, window_ticks=100, dt=0.1, start_time=None):
+        self.path = path if path.endswith(".npy") else path + ".npy"
+        self.sidecar_path = self.path[:-len(".npy")] + ".json"
+        self.store = store
+        self.arena = arena
+        self.max_ticks = max_ticks
+        self.growable = capacity is None
+        self.capacity = max(1, len(store) if capacity is None else capacity)
+        self.file_capacity = self.capacity  # Capacity of the file on disk, only the writer changes it after this
+        self.window_ticks = window_ticks
+        self.dt = dt
+        self.start_time = start_time
+
+        # Write the .npy header and size the file, the rows are mapped a window at a time by the writer
+        frames = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32, shape=(max_ticks, self.capacity, 3))
+        self.header_size = frames.offset
+        del frames
+        self.window = None
+        self.window_start = 0
+
+        # Ring of copy buffers, slots cycle between the free and the written queue
+        self.buffer_count = buffers
+        self.allocate_buffers()
+        self.pending = queue.Queue()
+
+        self.ticks = 0
+        self.counts = []  # [row, entity count] whenever the count changes
+        self.dropped = []  # Rows left empty because the writer was behind
+        self.truncated = False  # More entities than capacity, the extra ones are not recorded
+        self.written_ticks = 0  # Rows the writer is done with, written or dropped
+
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+        self.write_sidecar()
+
+    def allocate_buffers(self):
+        # Queued frames keep a reference to the ring they were copied into, so a new ring can replace it at any time
+        self.buffers = np.zeros((self.buffer_count, self.capacity, 3), dtype=np.float32)
+        self.free = queue.Queue()
+        for slot in range(self.buffer_count):
+            self.free.put(slot)
+
+    def record(self):
+        """Queue the current poses as the next row. Never blocks, returns False if the frame was dropped."""
+        if self.writer is None or self.ticks >= self.max_ticks:
+            return False
+
+        row = self.ticks
+        self.ticks += 1
+
+        if self.growable and len(self.store) > self.capacity:
+            # Rows before this one are widened by the writer before it writes this one
+            self.capacity = max(len(self.store), 2 * self.capacity)
+            self.allocate_buffers()
+            self.pending.put(("resize", row, self.capacity))
+
+        count = min(len(self.store), self.capacity)
+        self.truncated |= len(self.store) > self.capacity
+        if not self.counts or self.counts[-1][1] != count:
+            self.counts.append([row, count])
+
+        try:
+            slot = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped.append(row)
+            return False
+
+        buffer = self.buffers[slot]
+        buffer[:count, 0] = self.store.x[:count]
+        buffer[:count, 1] = self.store.y[:count]
+        buffer[:count, 2] = self.store.theta[:count]
+        self.pending.put(("frame", self.buffers, self.free, slot, row, count))
+        return True
+
+    def write_frames(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+
+            if item[0] == "resize":
+                self.resize_file(*item[1:])
+                continue
+
+            buffers, free, slot, row, count = item[1:]
+            if self.window is None or row >= self.window_start + len(self.window):
+                self.map_window(row)
+            self.window[row - self.window_start, :count] = buffers[slot, :count]
+            self.written_ticks = row + 1
+            free.put(slot)
+
+        self.unmap_window()
+
+    def resize_file(self, rows, capacity):
+        # Copy the rows recorded so far into a wider file a window at a time, then swap it in
+        self.unmap_window()
+        old = np.load(self.path, mmap_mode="r")
+        resized_path = self.path + ".resize"
+        frames = np.lib.format.open_memmap(resized_path, mode="w+", dtype=np.float32, shape=(self.max_ticks, capacity, 3))
+        for start in range(0, rows, self.window_ticks):
+            stop = min(start + self.window_ticks, rows)
+            frames[start:stop, :self.file_capacity] = old[start:stop]
+        frames.flush()
+        self.header_size = frames.offset
+        del frames, old
+        os.replace(resized_path, self.path)
+        self.file_capacity = capacity
+
+    def map_window(self, row):
+        # Rows arrive in order, so each window is written once and can be unmapped for good
+        self.unmap_window()
+        self.window_start = row - row % self.window_ticks
+        rows = min(self.window_ticks, self.max_ticks - self.window_start)
+        self.window = np.memmap(
+            self.path, dtype=np.float32, mode="r+",
+            offset=self.header_size + self.window_start * self.file_capacity * 3 * 4,
+            shape=(rows, self.file_capacity, 3)
+        )
+
+    def unmap_window(self):
+        if self.window is not None:
+            self.window.flush()
+            self.window = None
+            self.write_sidecar(self.written_ticks)
+
+    def close(self):
+        """Wait for the queued frames, flush the file and write the final sidecar."""
+        if self.writer is None:
+            return
+
+        self.pending.put(None)
+        self.writer.join()
+        self.writer = None
+        self.write_sidecar()
+
+    def write_sidecar(self, ticks=None):
+        """Describe the first ticks rows, all recorded ones by default. Replaced atomically, readers never see half a file.
+
+        The writer thread calls this while record() keeps appending, so the lists are copied and cut at ticks.
+        """
+        ticks = self.ticks if ticks is None else ticks
+        arena = self.arena
+        sidecar = {
+            "frames": self.path,
+            "shape": [self.max_ticks, self.file_capacity, 3],
+            "dtype": "float32",
+            "fields": ["x", "y", "theta"],
+            "dt": self.dt,
+            "start_time": self.start_time,
+            "ticks": ticks,
+            "counts": [count for count in list(self.counts) if count[0] < ticks],
+            "dropped": [row for row in list(self.dropped) if row < ticks],
+            "truncated": self.truncated,
+            "names": list(self.store.names[:self.file_capacity]),
+            "grid": arena.grid,
+            "pen": {
+                "x_min": arena.pen_x_min, "y_min": arena.pen_y_min,
+                "x_max": arena.pen_x_max, "y_max": arena.pen_y_max,
+                "size": arena.pen_size
+            },
+            "wolf_pens": [list(location) for location in arena.wolf_pen_locations]
+        }
+        partial_path = self.sidecar_path + ".partial"
+        with open(partial_path, "w") as file:
+            json.dump(sidecar, file, indent=2)
+        os.replace(partial_path, self.sidecar_path)
+
+
+class Recording():
+    """Read side of TrajectoryRecorder, frames are memory-mapped and indexed directly by tick."""
+
+    def __init__(self, path):
+        path = path if path.endswith(".npy") else path + ".npy"
+        with open(path[:-len(".npy")] + ".json") as file:
+            self.sidecar = json.load(file)
+
+        self.frames = np.load(path, mmap_mode="r")
+        self.ticks = self.sidecar["ticks"]
+        self.names = self.sidecar["names"]
+        self.grid = self.sidecar["grid"]
+        self.pen_size = self.sidecar["pen"]["size"]
+        self.dt = self.sidecar["dt"]
+        self.start_time = self.sidecar.get("start_time")  # None in recordings made before it was stored
+
+        # Entity count of every tick, expanded from the run-length counts
+        self.counts = np.zeros(self.ticks, dtype=np.intp)
+        for row, count in self.sidecar["counts"]:
+            self.counts[row:] = count
+        self.dropped = set(self.sidecar["dropped"])
+
+        # Row shown for every tick: the tick itself, or the last recorded row before a dropped one, -1 if there is none
+        self.last_recorded = np.arange(self.ticks)
+        self.last_recorded[list(self.dropped)] = -1
+        np.maximum.accumulate(self.last_recorded, out=self.last_recorded)
+
+    def __len__(self):
+        return self.ticks
+
+    def frame(self, tick):
+        """[count,3] view of the poses at tick. A dropped frame shows the last recorded one before it.
+
+        Empty [0,3] if nothing was recorded up to tick, e.g. before the first tick or in an empty recording.
+        """
+        if self.ticks == 0 or tick < 0:
+            return self.frames[0:0, 0]
+        row = self.last_recorded[min(tick, self.ticks - 1)]
+        if row < 0:
+            return self.frames[0:0, 0]
+        return self.frames[row, :self.counts[row]]
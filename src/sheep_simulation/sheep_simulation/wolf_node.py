@@ -1,8 +1,16 @@
 import rclpy
 from rclpy.node import Node
-from sheep_simulation_interfaces.msg import EntityPose, EntityPoseArray
-from sheep_simulation_interfaces.srv import EntitySpawn, Grid
-import math
+from sheep_simulation_interfaces.msg import EntityPose, EntityPoseArray, Grid, PenOccupancy, PoseBlock
+from sheep_simulation_interfaces.srv import EntityNames, EntitySpawn
+from sheep_simulation.arena import Arena
+from sheep_simulation.diagnostics import NodeProfiling
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.pose_block import fill_entity_names
+from sheep_simulation.pose_stream import PoseDeltaEncoder, PoseStream
+from sheep_simulation.qos import declare_qos_parameter, qos_profile
+from sheep_simulation.trajectory_recorder import TrajectoryRecorder
+from sheep_simulation.wolf_pack import WolfPack
+from std_srvs.srv import Trigger
 
 
 class WolfSimulationNode(Node):
@@ -12,180 +20,158 @@ class WolfSimulationNode(Node):
         # Timer for wolf logic
         self.timer = self.create_timer(0.1, self.update_simulation)
 
-        # List of all wolves
-        self.wolves = []
+        # Phase timings on /diagnostics and cProfile snapshots, see diagnostics.py
+        self.profiling = NodeProfiling(self, "wolf", tick_period=0.1)
+        self.phases = self.profiling.phases
+
+        # Poses of all wolves
+        self.wolves = FlockStore(capacity=4)
+
+        self.declare_parameter("publish_legacy_pose", False)  # Also publish EntityPoseArray on sheep_simulation/wolf/pose
+        self.declare_parameter("pose_delta_epsilon", 0.01)  # Wolves that moved less than this, and turned less than this in radians, since last sent are left out of a delta
+        self.declare_parameter("pose_keyframe_interval", 10)  # Ticks between keyframes, 1 to only send keyframes
+        pose_qos = declare_qos_parameter(self, "pose_qos")  # QoS preset for the pose topics, see qos.py
+
+        # Trajectory recording, see trajectory_recorder.py
+        self.declare_parameter("record_path", "")  # .npy file to record wolves poses to, empty to not record
+        self.declare_parameter("record_max_ticks", 10000)  # Ticks the file has room for
+        self.declare_parameter("record_capacity", 0)  # Wolves the file has room for, 0 to grow the file with the wolves
+        self.recorder = None
 
         # Services
         self.wolf_spawn_service = self.create_service(EntitySpawn, "sheep_simulation/wolf/spawn", self.wolf_spawn_callback)
-
-        # Clients
-        self.grid_init_client = self.create_client(Grid, 'sheep_simulation/grid')
-        while not self.grid_init_client.wait_for_service(timeout_sec=1.0):
-            self.get_logger().info('Waiting for grid service...')
+        self.wolf_names_service = self.create_service(EntityNames, "sheep_simulation/wolf/names", self.wolf_names_callback)
+        self.wolf_keyframe_service = self.create_service(Trigger, "sheep_simulation/wolf/keyframe", self.wolf_keyframe_callback)
 
         # Publishers
-        self.wolf_position_publisher = self.create_publisher(EntityPoseArray, 'sheep_simulation/wolf/pose', 10)
+        self.wolf_pose_block_publisher = self.create_publisher(PoseBlock, 'sheep_simulation/wolf/pose_block', pose_qos)
+        self.wolf_pose_encoder = PoseDeltaEncoder(
+            epsilon=self.get_parameter("pose_delta_epsilon").value,
+            keyframe_interval=self.get_parameter("pose_keyframe_interval").value
+        )
+        self.wolf_position_publisher = None
+        if self.get_parameter("publish_legacy_pose").value:
+            self.wolf_position_publisher = self.create_publisher(EntityPoseArray, 'sheep_simulation/wolf/pose', pose_qos)
 
         # Subscribers
-        self.sheep_position_subscription = self.create_subscription(EntityPoseArray, 'sheep_simulation/sheep/pose', self.sheep_position_callback, 10)
-        # self.wolf_position_subscription = self.create_subscription(Grid, 'sheep_simulation/grid', self.grid_initialisation_callback, 10)
-
-        # Tracking sheep positions and groups
-        self.sheep_positions = {}
-        self.group_assignments = {}  # Maps sheep to their assigned group
-
-        self.init_grid()
-
-
-    def init_grid(self):
-        # Create request
-        grid_request = Grid.Request()
-
-        future = self.grid_init_client.call_async(grid_request)
-
-        rclpy.spin_until_future_complete(self, future)
-
-        self.grid = [
-            [future.result().xmin, future.result().xmax],
-            [future.result().ymin, future.result().ymax]
+        self.sheep_position_subscription = self.create_subscription(PoseBlock, 'sheep_simulation/sheep/pose_block', self.sheep_position_callback, pose_qos)
+        self.pen_occupancy_subscription = self.create_subscription(PenOccupancy, 'sheep_simulation/sheep/pen_occupancy', self.pen_occupancy_callback, 10)
+        # The grid is latched, so it arrives whenever this node starts. When composed in one process set_arena is called directly instead
+        self.grid_subscription = self.create_subscription(Grid, 'sheep_simulation/grid', self.grid_initialisation_callback, qos_profile("latched"))
+
+        # Tracking sheep positions, indexed by the sheep node's entity ids
+        self.sheep_positions = FlockStore()
+        self.sheep_stream = PoseStream(self.sheep_positions, keyframe_client=self.create_client(Trigger, 'sheep_simulation/sheep/keyframe'))
+        self.pen_occupancy = None  # Latest pen occupancy summary from the sheep node
+
+    def set_arena(self, arena):
+        # Wolf behaviour lives in WolfPack, this node only moves data in and out of ROS
+        self.arena = arena
+        self.grid = arena.grid
+        self.pack = WolfPack(arena, wolves=self.wolves, sheep=self.sheep_positions)
+        self.pack.phases = self.phases
+
+    def grid_initialisation_callback(self, msg):
+        grid = [
+            [msg.xmin, msg.xmax],
+            [msg.ymin, msg.ymax]
         ]
 
-        self.pen_size = future.result().pensize
-
-        self.pen_x_min = self.grid[0][1] - self.pen_size
-        self.pen_y_min = self.grid[1][1] - self.pen_size
-        self.pen_x_max = self.grid[0][1]
-        self.pen_y_max = self.grid[1][1]
-        self.pen_center_x = self.pen_x_min + self.pen_size/2
-        self.pen_center_y = self.pen_y_min + self.pen_size/2
-
-        # Define wolf pens
-        self.wolf_pen_locations = {
-            "wolf1": (self.grid[0][0] + self.pen_size/4, self.grid[0][1] - self.pen_size/4),
-            "wolf2": (self.grid[0][0] + self.pen_size/4, self.grid[1][0] + self.pen_size/4),
-        }
+        self.set_arena(Arena(grid, msg.pensize))
 
 
     def wolf_spawn_callback(self, request, response):
         try:
-            for wolf in request.spawn_entities:
-
-                wolf_obj = {
-                    "name": wolf.name,
-                    "pose": {
-                        "x": wolf.x,
-                        "y": wolf.y,
-                        "theta": wolf.theta
-                    }
-                }
-
-                self.wolves.append(wolf_obj)
-                response.result = "ok"
-                self.get_logger().info(f"Spawned sheep: {wolf.name} at ({wolf.x}, {wolf.y})")
+            entities = request.spawn_entities
+            handles = self.wolves.extend(
+                [wolf.name for wolf in entities],
+                [wolf.x for wolf in entities],
+                [wolf.y for wolf in entities],
+                [wolf.theta for wolf in entities]
+            )
+            response.ids = handles.tolist()
+            response.result = "ok"
+            self.get_logger().info(f"Spawned {len(entities)} wolves: {', '.join(wolf.name for wolf in entities)}")
         except Exception as e:
             response.result = "fail"
             self.get_logger().error(f"Failed to spawn wolf: {e}")
         return response
 
-    def sheep_position_callback(self, msg):
-        # Track sheep positions by their names
-        for sheep in msg.entity_positions:
-            self.sheep_positions[sheep.name] = (sheep.x, sheep.y)
+    def wolf_names_callback(self, request, response):
+        return fill_entity_names(self.wolves, request, response)
 
-    def assign_sheep_groups(self):
-        """Assign sheep to groups based on proximity to wolves."""
-        sheep_names = list(self.sheep_positions.keys())
-        if len(self.wolves) < 2 or len(sheep_names) == 0:
-            return  # Skip if there are fewer than 2 wolves or no sheep
+    def wolf_keyframe_callback(self, request, response):
+        self.wolf_pose_encoder.request_keyframe()
+        response.success = True
+        return response
 
-        wolf_positions = [(wolf["pose"]["x"], wolf["pose"]["y"]) for wolf in self.wolves]
+    def sheep_position_callback(self, msg):
+        with self.phases.time("sheep_pose_block"):
+            self.sheep_stream.apply(msg)
 
-        # Assign sheep to closest wolf group
-        self.group_assignments.clear()
-        for sheep_name, (sheep_x, sheep_y) in self.sheep_positions.items():
-            distances = [math.hypot(sheep_x - wx, sheep_y - wy) for wx, wy in wolf_positions]
-            closest_wolf_index = distances.index(min(distances))
-            self.group_assignments[sheep_name] = closest_wolf_index
+    def pen_occupancy_callback(self, msg):
+        self.pen_occupancy = msg
 
     def update_simulation(self):
         if not hasattr(self, "grid"):
             return
 
-        self.assign_sheep_groups()  # Update sheep group assignments
-        
-        positions = []
-        for wolf_index, wolf in enumerate(self.wolves):
-            # Update the wolf's position
-            if self.sheep_safe():
-                self.return_to_pen(wolf["pose"], wolf_index)
-            else:
-                wolf["pose"] = self.herd_sheep(wolf["pose"], wolf_index)
-
-            entity = EntityPose()
-            entity.name = wolf["name"]
-            entity.x = wolf["pose"]["x"]
-            entity.y = wolf["pose"]["y"]
-            entity.theta = wolf["pose"]["theta"]
-            positions.append(entity)
-
-
-        self.publish_wolf_positions(positions)
-    
-    def sheep_safe(self):
-        return all([(pose[0] >= self.pen_x_min) and (pose[1] >= self.pen_y_min) for pose in self.sheep_positions.values()])
-
-    def return_to_pen(self, wolf_pose, wolf_index):
-        # All sheep are in the pen; return to the wolf pen if not in already
-        wolf_pen_x, wolf_pen_y = self.wolf_pen_locations[f"wolf{wolf_index + 1}"]
-
-        if not((wolf_pose["x"] <= wolf_pen_x+self.pen_size/4) and (wolf_pose["y"] <= wolf_pen_y+self.pen_size/4)):
-            direction_x = wolf_pen_x - wolf_pose["x"]
-            direction_y = wolf_pen_y - wolf_pose["y"]
-            move_length = math.hypot(direction_x, direction_y)
-            if move_length > 0:
-                wolf_pose["x"] += (direction_x / move_length) * 0.5
-                wolf_pose["y"] += (direction_y / move_length) * 0.5
-
-    def herd_sheep(self, wolf_pose, wolf_index):
-        # Target the assigned group of sheep
-        target_sheep = [
-            (name, pos) for name, pos in self.sheep_positions.items()
-            if self.group_assignments.get(name) == wolf_index
-        ]
-
-        if target_sheep:
-            # Find the furthest sheep in the assigned group
-            target_name, (sheep_x, sheep_y) = max(
-                target_sheep,
-                key=lambda s: math.hypot(s[1][0] - self.pen_center_x, s[1][1] - self.pen_center_y)
+        with self.profiling.tick():
+            self.pack.step(self.sheep_safe())
+            self.publish_wolf_positions()
+            with self.phases.time("record"):
+                self.record_tick()
+
+    def record_tick(self):
+        # Starts with the first tick that has wolves, record() itself never blocks the tick
+        if self.recorder is None:
+            path = self.get_parameter("record_path").value
+            if not path or len(self.wolves) == 0:
+                return
+            self.recorder = TrajectoryRecorder(
+                path, self.wolves, self.arena,
+                max_ticks=self.get_parameter("record_max_ticks").value,
+                capacity=self.get_parameter("record_capacity").value or None,
+                start_time=self.get_clock().now().nanoseconds / 1e9
+            )
+            self.get_logger().info(f"Recording wolves poses to {self.recorder.path}")
+
+        truncated = self.recorder.truncated
+        self.recorder.record()
+        if self.recorder.truncated and not truncated:
+            self.get_logger().warning(
+                f"{len(self.wolves)} wolves outgrew record_capacity {self.recorder.capacity}, "
+                "wolves past it are not recorded"
             )
 
-            # Guide the sheep group to the pen
-            delta_x = self.pen_center_x - sheep_x
-            delta_y = self.pen_center_y - sheep_y
-            theta_to_pen = math.atan2(delta_y, delta_x)
-
-            # Move the wolf behind the furthest sheep
-            distance_behind = 5.0
-            behind_x = sheep_x - distance_behind * math.cos(theta_to_pen)
-            behind_y = sheep_y - distance_behind * math.sin(theta_to_pen)
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
 
-            # Move the wolf towards the target position
-            direction_x = behind_x - wolf_pose["x"]
-            direction_y = behind_y - wolf_pose["y"]
-            move_length = math.hypot(direction_x, direction_y)
-            if move_length > 0:
-                wolf_pose["x"] += (direction_x / move_length) * 0.5
-                wolf_pose["y"] += (direction_y / move_length) * 0.5
+    def sheep_safe(self):
+        # No summary yet means no sheep have been reported, which counts as all penned
+        return self.pen_occupancy is None or self.pen_occupancy.all_penned
 
+    def publish_wolf_positions(self):
+        with self.phases.time("pose_encode"):
+            msg = self.wolf_pose_encoder.encode(self.wolves, self.get_clock().now().to_msg())
+        with self.phases.time("pose_publish"):
+            self.wolf_pose_block_publisher.publish(msg)
 
-        # limit to grid walls
-        wolf_pose["x"] = max(self.grid[0][0], min(wolf_pose["x"], self.grid[0][1]))
-        wolf_pose["y"] = max(self.grid[1][0], min(wolf_pose["y"], self.grid[1][1]))
+        if self.wolf_position_publisher is not None:
+            with self.phases.time("legacy_pose_publish"):
+                self.publish_legacy_wolf_positions()
 
-        return wolf_pose
+    def publish_legacy_wolf_positions(self):
+        positions = []
+        for name, x, y, theta in zip(self.wolves.names, self.wolves.x.tolist(), self.wolves.y.tolist(), self.wolves.theta.tolist()):
+            entity = EntityPose()
+            entity.name = name
+            entity.x = x
+            entity.y = y
+            entity.theta = theta
+            positions.append(entity)
 
-    def publish_wolf_positions(self, positions):
         msg = EntityPoseArray()
         msg.entity_positions = positions
         self.wolf_position_publisher.publish(msg)
@@ -194,5 +180,10 @@ class WolfSimulationNode(Node):
 def main(args=None):
     rclpy.init(args=args)
     node = WolfSimulationNode()
-    rclpy.spin(node)
-    rclpy.shutdown()
+    try:
+        rclpy.spin(node)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.stop_recording()
+    rclpy.try_shutdown()
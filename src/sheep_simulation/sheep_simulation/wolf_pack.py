@@ -0,0 +1,119 @@
+import numpy as np
+
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.profiling import NULL_PHASES
+
+
+class WolfPack():
+    """Wolf behaviour for one tick: split the flock between wolves and herd each group to the pen.
+
+    The whole tick works on arrays: one sheep x wolf distance matrix for the
+    group assignments and one grouped argmax for each wolf's target sheep.
+    """
+
+    # Wolves stand this far behind their target sheep and move this far per tick
+    DISTANCE_BEHIND = 5.0
+    STEP = 0.5
+
+    def __init__(self, arena, wolves=None, sheep=None):
+        self.arena = arena
+
+        # Poses of all wolves
+        self.wolves = wolves if wolves is not None else FlockStore(capacity=4)
+
+        # Latest sheep positions, and the wolf each sheep is assigned to (-1 for none yet)
+        self.sheep = sheep if sheep is not None else FlockStore()
+        self.group_assignments = np.zeros(0, dtype=np.intp)
+
+        # Times the phases of step(), the wolf node swaps in its PhaseTimer
+        self.phases = NULL_PHASES
+
+    def spawn(self, names, x, y, theta):
+        return self.wolves.extend(names, x, y, theta)
+
+    def step(self, sheep_safe):
+        """Advance the wolves one tick, sheep_safe is True once the whole flock is penned."""
+        grid = self.arena.grid
+
+        with self.phases.time("assign_groups"):
+            self.assign_sheep_groups()  # Update sheep group assignments
+
+        with self.phases.time("herd"):
+            if sheep_safe:
+                self.return_to_pen()
+            else:
+                self.herd_sheep()
+
+        # limit to grid walls
+        np.clip(self.wolves.x, grid[0][0], grid[0][1], out=self.wolves.x)
+        np.clip(self.wolves.y, grid[1][0], grid[1][1], out=self.wolves.y)
+
+    def assign_sheep_groups(self):
+        """Assign sheep to groups based on proximity to wolves."""
+        if len(self.wolves) < 2 or len(self.sheep) == 0:
+            return  # Skip if there are fewer than 2 wolves or no sheep
+
+        # Assign sheep to closest wolf group, first wolf wins ties
+        distances = np.hypot(
+            self.sheep.x.astype(float)[:, None] - self.wolves.x.astype(float)[None, :],
+            self.sheep.y.astype(float)[:, None] - self.wolves.y.astype(float)[None, :]
+        )
+        self.group_assignments = np.argmin(distances, axis=1)
+
+    def select_targets(self):
+        """Index of the sheep furthest from the pen in each wolf's group, -1 for wolves with no sheep."""
+        targets = np.full(len(self.wolves), -1, dtype=np.intp)
+
+        count = min(len(self.sheep), len(self.group_assignments))
+        groups = self.group_assignments[:count]
+        pen_distances = np.hypot(
+            self.sheep.x[:count].astype(float) - self.arena.pen_center_x,
+            self.sheep.y[:count].astype(float) - self.arena.pen_center_y
+        )
+
+        # Sort by group, then furthest first (stable, so the first sheep wins ties) and take each group's head
+        order = np.lexsort((-pen_distances, groups))
+        groups = groups[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = groups[1:] != groups[:-1]
+        first &= (groups >= 0) & (groups < len(targets))
+
+        targets[groups[first]] = order[first]
+        return targets
+
+    def move_towards(self, wolf_indices, target_x, target_y):
+        """Move the given wolves STEP towards their targets."""
+        direction_x = target_x - self.wolves.x[wolf_indices].astype(float)
+        direction_y = target_y - self.wolves.y[wolf_indices].astype(float)
+        move_length = np.hypot(direction_x, direction_y)
+
+        moving = move_length > 0
+        wolf_indices = wolf_indices[moving]
+        self.wolves.x[wolf_indices] += ((direction_x[moving] / move_length[moving]) * self.STEP).astype(np.float32)
+        self.wolves.y[wolf_indices] += ((direction_y[moving] / move_length[moving]) * self.STEP).astype(np.float32)
+
+    def return_to_pen(self):
+        # All sheep are in the pen; return to the wolf pen if not in already
+        pen_size = self.arena.pen_size
+        pens = np.array([self.arena.wolf_pen_location(i) for i in range(len(self.wolves))]).reshape(-1, 2)
+
+        outside = ~((self.wolves.x <= pens[:, 0] + pen_size/4) & (self.wolves.y <= pens[:, 1] + pen_size/4))
+        wolf_indices = np.flatnonzero(outside)
+        self.move_towards(wolf_indices, pens[wolf_indices, 0], pens[wolf_indices, 1])
+
+    def herd_sheep(self):
+        pen_center_x, pen_center_y = self.arena.pen_center_x, self.arena.pen_center_y
+
+        # Target the furthest sheep in each wolf's assigned group
+        targets = self.select_targets()
+        wolf_indices = np.flatnonzero(targets >= 0)
+        sheep_x = self.sheep.x[targets[wolf_indices]].astype(float)
+        sheep_y = self.sheep.y[targets[wolf_indices]].astype(float)
+
+        # Guide the sheep group to the pen
+        theta_to_pen = np.arctan2(pen_center_y - sheep_y, pen_center_x - sheep_x)
+
+        # Move the wolf behind the furthest sheep
+        behind_x = sheep_x - self.DISTANCE_BEHIND * np.cos(theta_to_pen)
+        behind_y = sheep_y - self.DISTANCE_BEHIND * np.sin(theta_to_pen)
+        self.move_towards(wolf_indices, behind_x, behind_y)
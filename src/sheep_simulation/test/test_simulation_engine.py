@@ -0,0 +1,21 @@
+import numpy as np
+
+from sheep_simulation.simulation_engine import SimulationEngine
+
+
+def run(seed, ticks=50):
+    engine = SimulationEngine(seed=seed)
+    engine.spawn_default(sheep_count=200)
+    engine.run(ticks, until_penned=False)
+    return engine.state()
+
+
+def test_same_seed_same_run():
+    first, second = run(seed=11), run(seed=11)
+    assert first["tick"] == second["tick"] == 50
+    np.testing.assert_array_equal(first["sheep"], second["sheep"])
+    np.testing.assert_array_equal(first["wolves"], second["wolves"])
+
+
+def test_different_seed_different_run():
+    assert not np.array_equal(run(seed=11)["sheep"], run(seed=12)["sheep"])
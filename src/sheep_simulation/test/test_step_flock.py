@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from sheep_simulation.neighbor_index import NEIGHBOR_INDEX_BACKENDS, make_neighbor_index
+from sheep_simulation.PsuedoSheepSeperationPort import PsuedoSheep
+
+
+def flock(count, seed):
+    # Dense enough that most sheep have cohesion neighbours and some are within the separation distance
+    rng = np.random.default_rng(seed)
+    positions = np.zeros((count, 3))
+    positions[:, :2] = rng.uniform(-10.0, 10.0, (count, 2))
+    positions[:, 2] = rng.uniform(0.0, 2 * np.pi, count)
+    # A duplicate pose, zero distance pairs are left out by both paths
+    positions[1] = positions[0]
+    return positions
+
+
+def reference_steps(positions):
+    # The per-sheep boids update step_flock replaces
+    sheep = PsuedoSheep.__new__(PsuedoSheep)
+    sheep.logger = None
+    return np.array([sheep.update_velocity(position, positions) for position in positions]).reshape(-1, 3)
+
+
+@pytest.mark.parametrize("backend", NEIGHBOR_INDEX_BACKENDS)
+def test_step_flock_matches_update_velocity(backend):
+    positions = flock(300, seed=1)
+    index = make_neighbor_index(backend, cell_size=PsuedoSheep.COHESSION_DIST)
+    index.build(positions)
+
+    steps = PsuedoSheep.step_flock(positions, index.query_pairs(PsuedoSheep.COHESSION_DIST))
+
+    np.testing.assert_allclose(steps, reference_steps(positions), rtol=0, atol=1e-9)
+
+
+def test_step_flock_defaults_to_brute_force():
+    positions = flock(100, seed=2)
+    np.testing.assert_allclose(PsuedoSheep.step_flock(positions), reference_steps(positions), rtol=0, atol=1e-9)
+
+
+def test_step_flock_lone_sheep_stands_still():
+    positions = np.array([[0.0, 0.0, 1.0], [50.0, 50.0, 2.0]])
+    np.testing.assert_array_equal(PsuedoSheep.step_flock(positions), np.zeros((2, 3)))
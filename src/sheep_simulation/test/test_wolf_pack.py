@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+import pytest
+
+from sheep_simulation.arena import Arena
+from sheep_simulation.flock_store import FlockStore
+from sheep_simulation.wolf_pack import WolfPack
+
+
+class ReferencePack():
+    # The per-wolf loop WolfPack replaced, sheep positions keyed by name
+
+    def __init__(self, arena, wolves):
+        self.arena = arena
+        self.wolves = wolves
+        self.sheep_positions = {}
+        self.group_assignments = {}
+
+    def step(self, sheep_safe):
+        grid = self.arena.grid
+        self.assign_sheep_groups()
+        for wolf_index in range(len(self.wolves)):
+            if sheep_safe:
+                self.return_to_pen(wolf_index)
+            else:
+                self.herd_sheep(wolf_index)
+        np.clip(self.wolves.x, grid[0][0], grid[0][1], out=self.wolves.x)
+        np.clip(self.wolves.y, grid[1][0], grid[1][1], out=self.wolves.y)
+
+    def assign_sheep_groups(self):
+        if len(self.wolves) < 2 or len(self.sheep_positions) == 0:
+            return
+        wolf_positions = list(zip(self.wolves.x.tolist(), self.wolves.y.tolist()))
+        self.group_assignments.clear()
+        for sheep_name, (sheep_x, sheep_y) in self.sheep_positions.items():
+            distances = [math.hypot(sheep_x - wx, sheep_y - wy) for wx, wy in wolf_positions]
+            self.group_assignments[sheep_name] = distances.index(min(distances))
+
+    def move_towards(self, wolf_index, target_x, target_y):
+        direction_x = target_x - float(self.wolves.x[wolf_index])
+        direction_y = target_y - float(self.wolves.y[wolf_index])
+        move_length = math.hypot(direction_x, direction_y)
+        if move_length > 0:
+            self.wolves.x[wolf_index] += (direction_x / move_length) * 0.5
+            self.wolves.y[wolf_index] += (direction_y / move_length) * 0.5
+
+    def return_to_pen(self, wolf_index):
+        pen_size = self.arena.pen_size
+        wolf_pen_x, wolf_pen_y = self.arena.wolf_pen_location(wolf_index)
+        wolf_x, wolf_y = float(self.wolves.x[wolf_index]), float(self.wolves.y[wolf_index])
+        if not ((wolf_x <= wolf_pen_x + pen_size / 4) and (wolf_y <= wolf_pen_y + pen_size / 4)):
+            self.move_towards(wolf_index, wolf_pen_x, wolf_pen_y)
+
+    def herd_sheep(self, wolf_index):
+        pen_center_x, pen_center_y = self.arena.pen_center_x, self.arena.pen_center_y
+        target_sheep = [
+            (name, pos) for name, pos in self.sheep_positions.items()
+            if self.group_assignments.get(name) == wolf_index
+        ]
+        if target_sheep:
+            _, (sheep_x, sheep_y) = max(
+                target_sheep,
+                key=lambda s: math.hypot(s[1][0] - pen_center_x, s[1][1] - pen_center_y)
+            )
+            theta_to_pen = math.atan2(pen_center_y - sheep_y, pen_center_x - sheep_x)
+            self.move_towards(
+                wolf_index,
+                sheep_x - 5.0 * math.cos(theta_to_pen),
+                sheep_y - 5.0 * math.sin(theta_to_pen)
+            )
+
+
+def wolf_store(arena, count):
+    wolves = FlockStore(capacity=4)
+    pens = [arena.wolf_pen_location(i) for i in range(count)]
+    wolves.extend([f"wolf{i + 1}" for i in range(count)], [p[0] for p in pens], [p[1] for p in pens], [0.0] * count)
+    return wolves
+
+
+@pytest.mark.parametrize("wolf_count", [1, 2, 3])
+def test_wolf_pack_matches_per_wolf_loop(wolf_count):
+    arena = Arena(Arena.create_grid(50.0), 10.0)
+    rng = np.random.default_rng(wolf_count)
+    count = 200
+
+    sheep = FlockStore()
+    sheep.extend([f"sheep{i}" for i in range(count)], rng.uniform(-25, 25, count), rng.uniform(-25, 25, count), np.zeros(count))
+    # Ties between sheep on the same distance from the pen, the first one is targeted
+    sheep.x[1], sheep.y[1] = sheep.x[0], sheep.y[0]
+
+    pack = WolfPack(arena, wolves=wolf_store(arena, wolf_count), sheep=sheep)
+    reference = ReferencePack(arena, wolf_store(arena, wolf_count))
+
+    for tick in range(100):
+        # The sheep wander, then the flock is penned for the last ticks and the wolves head home
+        sheep.x[:] += rng.normal(0.0, 0.3, count).astype(np.float32)
+        sheep.y[:] += rng.normal(0.0, 0.3, count).astype(np.float32)
+        reference.sheep_positions = dict(zip(sheep.names, zip(sheep.x.tolist(), sheep.y.tolist())))
+        sheep_safe = tick >= 80
+
+        pack.step(sheep_safe)
+        reference.step(sheep_safe)
+
+        np.testing.assert_array_equal(pack.wolves.x, reference.wolves.x)
+        np.testing.assert_array_equal(pack.wolves.y, reference.wolves.y)
+        if wolf_count >= 2:
+            assert pack.group_assignments.tolist() == [reference.group_assignments[name] for name in sheep.names]